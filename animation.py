@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Animated GIF/WebP handling
+Streams frames one at a time through rendering and into an animated WebP encoder,
+with optional frame-rate decimation and frame-count / byte budgets
+"""
+
+import logging
+import contextlib
+from typing import Callable, Tuple
+from PIL import Image
+import config
+
+logger = logging.getLogger(__name__)
+
+# Frame duration assumed when a frame does not specify one (as browsers do)
+DEFAULT_FRAME_DURATION = 100
+
+
+def is_animated(img: Image.Image) -> bool:
+    """Check whether an opened image has more than one frame"""
+    return getattr(img, 'is_animated', False)
+
+
+class StreamingWebPEncoder:
+    """
+    Incremental animated WebP encoder. Frames are encoded as they are added, so only
+    the compressed animation is kept in memory, never the decoded frames.
+    Uses Pillow's WebP animation encoder directly; check can_encode_animation()
+    before use.
+    """
+    # _webp is private: the positional arguments below follow WebPImagePlugin._save_all
+    # and were checked against Pillow 11.0, 11.1, 11.2, 11.3, 12.0 and 12.3 (10.x takes
+    # different add() arguments, hence Pillow>=11 in requirements.txt):
+    # WebPAnimEncoder(size, background, loop, minimize_size, kmin, kmax, allow_mixed,
+    # verbose) and add(image, timestamp, lossless, quality, alpha_quality, method).
+    # Re-check them when upgrading Pillow; can_encode_animation() catches a mismatch.
+
+    def __init__(self, size: Tuple[int, int], settings: config.Settings, loop: int = 0):
+        from PIL import _webp
+
+        self.quality = settings.quality
+        # Pillow's own animated save defaults to method 0; use the still-image effort instead
+        self.method = settings.webp_method
+        # White background, minimize_size off, keyframe interval 3-5 as in Pillow's defaults
+        options = (0xFFFFFFFF, loop, False, 3, 5, False, False)
+        try:
+            self.encoder = _webp.WebPAnimEncoder(size, *options)
+        except TypeError:
+            # Pillow before 11.2 takes width and height separately
+            self.encoder = _webp.WebPAnimEncoder(size[0], size[1], *options)
+
+    def add(self, frame: Image.Image, timestamp: int) -> None:
+        """Encode one RGB frame starting at timestamp (ms)"""
+        self.encoder.add(frame.getim(), timestamp, False, self.quality, 100, self.method)
+
+    def finish(self, end_timestamp: int) -> bytes:
+        """Flush the encoder and return the animated WebP file"""
+        self.encoder.add(None, end_timestamp, False, self.quality, 100, self.method)
+        data = self.encoder.assemble(b"", b"", b"")
+        if data is None:
+            raise OSError("cannot write file as WebP (encoder returned None)")
+        return data
+
+
+# Result of the one-time encoder check in this process; None until checked
+_encoder_usable = None
+
+
+def can_encode_animation() -> bool:
+    """
+    Check once per process, with a tiny two-frame test encode, that this Pillow's
+    animation encoder accepts the arguments used here. If not (Pillow before 11 or a
+    changed private signature), warn once; animated inputs are then written as still
+    images instead of every one of them failing.
+    """
+    global _encoder_usable
+    if _encoder_usable is None:
+        try:
+            encoder = StreamingWebPEncoder((1, 1), config.Settings())
+            frame = Image.new('RGB', (1, 1))
+            encoder.add(frame, 0)
+            encoder.add(frame, DEFAULT_FRAME_DURATION)
+            encoder.finish(2 * DEFAULT_FRAME_DURATION)
+            _encoder_usable = True
+        except (ImportError, AttributeError, TypeError, ValueError, OSError) as e:
+            import PIL
+            logger.warning("Animated WebP encoding is not supported with Pillow %s (%s); "
+                           "animated images are saved as still images", PIL.__version__, e)
+            _encoder_usable = False
+    return _encoder_usable
+
+
+def encode_animation(img: Image.Image, render_frame: Callable[[Image.Image], Image.Image],
+                     settings: config.Settings, guard=contextlib.nullcontext) -> Tuple[bytes, Image.Image]:
+    """
+    Render every kept frame of an animated image and encode the result as animated WebP.
+    Returns the encoded file and the first rendered frame. guard is a context manager
+    factory wrapped around each seek, to classify decoder errors.
+    """
+    max_fps = settings.animation_max_fps
+    min_interval = 1000.0 / max_fps if max_fps else 0.0
+    max_frames = settings.animation_max_frames
+    max_bytes = settings.animation_max_bytes
+
+    encoder = None
+    first_frame = None
+    kept_frames = 0
+    fed_bytes = 0
+    timestamp = 0
+    last_kept = None
+    index = 0
+
+    while True:
+        try:
+            with guard():
+                img.seek(index)
+        except EOFError:
+            break
+        index += 1
+
+        duration = img.info.get('duration') or DEFAULT_FRAME_DURATION
+        frame_start = timestamp
+        timestamp += duration
+
+        # Decimation: drop frames that start too soon after the last kept one;
+        # the kept frame is then shown until the next kept frame starts
+        if last_kept is not None and frame_start - last_kept < min_interval:
+            continue
+
+        if (max_frames and kept_frames >= max_frames) or (max_bytes and fed_bytes >= max_bytes):
+            logger.warning("Animation budget reached after %d frames, truncating", kept_frames)
+            timestamp = frame_start
+            break
+
+        frame = render_frame(img)
+        if frame is img:
+            # Nothing needed rendering; detach the frame before the source seeks on
+            frame = img.copy()
+        if encoder is None:
+            encoder = StreamingWebPEncoder(frame.size, settings, img.info.get('loop', 0))
+            first_frame = frame
+        encoder.add(frame, round(frame_start))
+
+        last_kept = frame_start
+        kept_frames += 1
+        fed_bytes += frame.size[0] * frame.size[1] * len(frame.getbands())
+
+    if encoder is None:
+        raise OSError("animation has no frames")
+
+    return encoder.finish(round(timestamp)), first_frame
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Archive streaming for batch processing
+Reads images straight out of zip/tar archives and writes results into a zip/tar
+archive, without unpacking anything to disk
+"""
+
+import io
+import time
+import logging
+import tarfile
+import zipfile
+from collections import deque
+from pathlib import Path, PurePosixPath
+from typing import Iterator, List, Tuple, Optional
+from image_processor import ImageProcessor, process_stream_in_worker
+
+logger = logging.getLogger(__name__)
+
+
+def is_archive(path: Path) -> bool:
+    """Check whether a path names a supported archive"""
+    name = path.name.lower()
+    return name.endswith(('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz'))
+
+
+def safe_member_name(name: str) -> str:
+    """
+    Normalized relative member name; raises ValueError for absolute names or names
+    that climb out of the archive root, so untrusted archives cannot write elsewhere
+    """
+    normalized = name.replace('\\', '/')
+    path = PurePosixPath(normalized)
+    if (not normalized or path.is_absolute() or '..' in path.parts
+            or (path.parts and ':' in path.parts[0])):
+        raise ValueError(f"Unsafe archive member name: {name!r}")
+    return path.as_posix()
+
+
+def iter_archive_members(archive_path: Path, processor: ImageProcessor) -> Iterator[Tuple[str, bytes]]:
+    """Yield (member name, data) for every supported image in a zip or tar archive, in archive order"""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and processor.is_image_file(Path(info.filename)):
+                    name = checked_member_name(info.filename)
+                    if name is not None:
+                        yield name, archive.read(info)
+        return
+
+    # Stream mode reads the tar sequentially, so compressed tars are never seeked
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and processor.is_image_file(Path(member.name)):
+                name = checked_member_name(member.name)
+                if name is not None:
+                    yield name, archive.extractfile(member).read()
+
+
+def checked_member_name(name: str) -> Optional[str]:
+    """Safe member name, or None (with a warning) for members that must be skipped"""
+    try:
+        return safe_member_name(name)
+    except ValueError as e:
+        logger.warning("Skipping archive member: %s", e)
+        return None
+
+
+class ArchiveWriter:
+    """Write processed images into a zip or tar archive"""
+
+    def __init__(self, archive_path: Path):
+        self.archive_path = archive_path
+        name = archive_path.name.lower()
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if name.endswith('.zip'):
+            # WebP is already compressed, so members are stored as-is
+            self.archive = zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_STORED)
+        elif name.endswith('.tar'):
+            self.archive = tarfile.open(archive_path, 'w')
+        elif name.endswith(('.tar.gz', '.tgz')):
+            self.archive = tarfile.open(archive_path, 'w:gz')
+        elif name.endswith('.tar.bz2'):
+            self.archive = tarfile.open(archive_path, 'w:bz2')
+        elif name.endswith('.tar.xz'):
+            self.archive = tarfile.open(archive_path, 'w:xz')
+        else:
+            raise ValueError(f"Unsupported archive type: {archive_path}")
+
+    def add(self, name: str, data: memoryview) -> None:
+        """Add one encoded image under the given member name"""
+        name = safe_member_name(name)
+        if isinstance(self.archive, zipfile.ZipFile):
+            with self.archive.open(name, 'w') as member:
+                member.write(data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DirectoryWriter:
+    """Write processed images below a directory, mirroring archive member names"""
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = base_dir
+
+    def add(self, name: str, data: memoryview) -> None:
+        """Write one encoded image to base_dir / name"""
+        dest_path = self.base_dir / safe_member_name(name)
+        # Belt and braces: the resolved path (following symlinks) must stay below base_dir
+        if not dest_path.resolve().is_relative_to(self.base_dir.resolve()):
+            raise ValueError(f"Output path escapes {self.base_dir}: {name!r}")
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(dest_path, 'wb') as f:
+            f.write(data)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArchiveProcessor:
+    def __init__(self, image_processor: ImageProcessor):
+        self.processor = image_processor
+        self.settings = image_processor.settings
+
+    def output_name(self, member_name: str, default_folder: str) -> str:
+        """Output member name, following the folder naming used for directory runs"""
+        member = PurePosixPath(member_name)
+        folder = member.parent
+        folder_name = folder.name or default_folder
+        mapped_name = self.processor.get_folder_name_mapping(folder_name)
+        dest_folder = folder.parent / f"{folder_name}{self.settings.destination_suffix}"
+        return (dest_folder / f"{mapped_name}_{member.stem}.webp").as_posix()
+
+    def iter_folder_sources(self, jobs: List[Tuple[Path, Path]]) -> Iterator[Tuple[str, str, bytes, Optional[str]]]:
+        """Yield (key, output name, data, category) for source directory jobs"""
+        for source_path, dest_path in jobs:
+            yield (self.processor.relative_key(source_path),
+                   self.processor.relative_key(dest_path),
+                   source_path.read_bytes(),
+                   self.processor.get_category(source_path))
+
+    def iter_archive_sources(self, archive_path: Path) -> Iterator[Tuple[str, str, bytes, Optional[str]]]:
+        """
+        Yield (key, output name, data, category) for the images in an archive; the
+        category is the member's top-level folder, as for files in the source directory
+        """
+        default_folder = archive_path.name.split('.')[0]
+        for member_name, data in iter_archive_members(archive_path, self.processor):
+            parts = PurePosixPath(member_name).parts
+            yield (f"{archive_path.name}:{member_name}",
+                   self.output_name(member_name, default_folder),
+                   data,
+                   parts[0] if len(parts) > 1 else None)
+
+    def run(self, sources: Iterator[Tuple[str, str, bytes, Optional[str]]], writer) -> None:
+        """
+        Process sources in isolated worker processes and hand results to the writer in
+        source order. Only a small window of images is held in memory at once and
+        nothing is written to temporary files, so resource use does not grow with
+        archive size. Images that are unreadable, time out or crash their worker are
+        quarantined like in directory runs.
+        """
+        window_size = max(1, self.processor.workers) * 2
+        # (index, key, name, data) in source order, and results of finished ones by index;
+        # archives may repeat a member name, so keys are not used to match results
+        window = deque()
+        results = {}
+
+        def collect(pool):
+            for (index, key), status, value in pool.wait():
+                if status == 'ok':
+                    results[index] = value
+                else:
+                    reason = self.processor.worker_failure(key, status, value)
+                    elapsed = self.settings.image_timeout if status == 'timeout' else 0.0
+                    results[index] = (None, elapsed, reason)
+
+        def flush():
+            # Write finished images at the head of the window, keeping source order
+            while window and window[0][0] in results:
+                index, key, name, data = window.popleft()
+                encoded, elapsed, reason = results.pop(index)
+                ok = encoded is not None
+                if ok:
+                    writer.add(name, encoded)
+                    self.processor.processed_count += 1
+                else:
+                    self.processor.error_count += 1
+                    if reason:
+                        self.processor.quarantine_data(key, data, reason)
+                bytes_out = len(encoded) if ok else 0
+                self.processor.manifest.record(key, name, ok, elapsed, len(data), bytes_out, reason)
+                self.processor.progress.update(ok, len(data), bytes_out)
+
+        with self.processor.worker_pool(process_stream_in_worker) as pool:
+            for index, (key, name, data, category) in enumerate(sources):
+                if self.processor.deadline.reached():
+                    logger.info("Deadline reached, stopping archive run")
+                    break
+                while not pool.idle() or len(window) >= window_size:
+                    collect(pool)
+                    flush()
+                pool.submit((index, key), (key, data, category))
+                window.append((index, key, name, data))
+            while pool.busy():
+                collect(pool)
+            flush()
+
+        logger.info("Archive run complete: %d processed, %d errors",
+                    self.processor.processed_count, self.processor.error_count)
+
+    def process(self, archive_in: Optional[Path], archive_out: Optional[Path]) -> None:
+        """Process from an archive or the source directory into an archive or directory"""
+        if archive_in is not None:
+            # Archives are streamed, so the total is not known up front
+            sources, total = self.iter_archive_sources(archive_in), None
+        else:
+            jobs = [job for job in self.processor.collect_all_jobs() if self.processor.in_shard(job[0])]
+            sources, total = self.iter_folder_sources(jobs), len(jobs)
+
+        if archive_out is not None:
+            writer = ArchiveWriter(archive_out)
+        else:
+            writer = DirectoryWriter(archive_in.parent / f"{archive_in.name.split('.')[0]}"
+                                                          f"{self.settings.destination_suffix}")
+
+        self.processor.progress.start(total)
+        with writer:
+            self.run(sources, writer)
+        self.processor.progress.finish()
@@ -5,10 +5,16 @@ Provides different processing modes and options
 """
 
 import sys
+import json
 import argparse
 from pathlib import Path
-from image_processor import ImageProcessor
+from typing import List, Optional
+from image_processor import ImageProcessor, apply_pixel_limit, process_image_in_worker
+from log_utils import setup_logging
 from folder_utils import FolderUtils
+from shard_utils import WorkQueue, merge_manifests, parse_shard
+from scheduler import Deadline
+from smart_crop import parse_aspect
 import config
 
 class BatchProcessor:
@@ -18,7 +24,7 @@ class BatchProcessor:
     
     def process_single_folder(self, folder_name: str) -> None:
         """Process a single folder by name"""
-        source_path = Path(config.SOURCE_DIR) / folder_name
+        source_path = self.image_processor.source_dir / folder_name
         
         if not source_path.exists():
             print(f"Folder not found: {folder_name}")
@@ -46,6 +52,213 @@ class BatchProcessor:
             # Restore original formats
             self.image_processor.supported_formats = original_formats
     
+    def set_shard(self, shard_spec: str) -> None:
+        """Restrict processing to one deterministic shard (e.g. '0/4')"""
+        shard = parse_shard(shard_spec)
+        self.image_processor.shard = shard
+        self.image_processor.manifest.shard = shard
+        print(f"Processing shard {shard[0]}/{shard[1]}")
+    
+    def set_deadline(self, seconds: float) -> None:
+        """Stop starting new images once the time budget is used up"""
+        self.image_processor.deadline = Deadline(seconds)
+        print(f"Time budget: {seconds:.0f}s (highest-priority images first)")
+    
+    def set_crop_aspect(self, aspect: str) -> None:
+        """Smart-crop every image to a fixed aspect ratio (e.g. '4:3')"""
+        parse_aspect(aspect)
+        settings = self.image_processor.settings
+        settings.crop_aspect = aspect
+        settings.crop_aspect_by_category = {}
+        print(f"Cropping to aspect ratio {aspect}")
+    
+    def set_progress(self, bar: Optional[bool], status_file: Optional[str], port: Optional[int]) -> None:
+        """Configure the progress bar, status file and HTTP endpoint for this run"""
+        settings = self.image_processor.settings
+        if bar is not None:
+            settings.progress_bar = bar
+        if status_file:
+            settings.progress_status_file = status_file
+        if port is not None:
+            settings.progress_port = port
+    
+    def set_image_timeout(self, seconds: float) -> None:
+        """Kill and quarantine images that take longer than this (0 disables the timeout)"""
+        self.image_processor.settings.image_timeout = seconds or None
+    
+    def start_profiling(self, sample_rate: Optional[float]) -> None:
+        """Profile a sample of images in every process, writing into a new run folder"""
+        import time
+        import profiling
+        
+        settings = self.image_processor.settings
+        settings.profile = True
+        if sample_rate is not None:
+            settings.profile_sample_rate = sample_rate
+        settings.profile_dir = str(Path(settings.profile_dir) / time.strftime("run-%Y%m%d-%H%M%S"))
+        profiling.start(settings)
+        print(f"Profiling {settings.profile_sample_rate:.0%} of images into {settings.profile_dir}")
+    
+    def write_profile_report(self) -> None:
+        """Merge the profile data of all processes into one report"""
+        import profiling
+        
+        profiling.stop()
+        profile_dir = Path(self.image_processor.settings.profile_dir)
+        report = profiling.build_report(profile_dir)
+        print(report)
+        if profile_dir.exists():
+            (profile_dir / "report.txt").write_text(report, encoding='utf-8')
+            print(f"Profile report written: {profile_dir / 'report.txt'}")
+    
+    def set_workers(self, workers: int) -> None:
+        """Process images across several worker processes"""
+        self.image_processor.workers = max(1, workers)
+    
+    def process_from_queue(self, queue_path: str) -> None:
+        """Claim jobs from a shared SQLite queue until it is drained"""
+        processor = self.image_processor
+        shard_index, shard_count = processor.shard or (None, 1)
+        worker = processor.manifest.worker
+        queue = WorkQueue(Path(queue_path))
+        
+        try:
+            # Every node publishes the same job list in scheduled order; existing entries are left alone
+            jobs = [(processor.relative_key(source), processor.relative_key(dest))
+                    for source, dest in processor.schedule_jobs(processor.collect_all_jobs())]
+            added = queue.populate(jobs, shard_count)
+            print(f"Queue {queue_path}: {added} new jobs, {len(jobs)} discovered")
+            
+            # Other nodes claim from the same queue, so this node's total is not known
+            processor.progress.start(None)
+            self.drain_queue(queue, worker, shard_index)
+            processor.progress.finish()
+            
+            processor.save_hash_index()
+            print(f"Queue drained: {queue.counts()}")
+        finally:
+            queue.close()
+    
+    def drain_queue(self, queue: WorkQueue, worker: str, shard_index: Optional[int]) -> None:
+        """
+        Run claimed jobs in isolated worker processes, claiming only as many as there
+        are idle workers. Jobs that time out or crash their worker are quarantined
+        like in directory runs and marked failed in the queue.
+        """
+        processor = self.image_processor
+        drained = False
+        
+        with processor.worker_pool(process_image_in_worker) as pool:
+            while True:
+                while not drained and pool.idle() and not processor.deadline.reached():
+                    claimed = queue.claim(worker, shard_index)
+                    if claimed is None:
+                        drained = True
+                        break
+                    source_key, dest_key = claimed
+                    pool.submit(claimed, (processor.source_dir / source_key, processor.source_dir / dest_key))
+                
+                if not pool.busy():
+                    break
+                
+                for (source_key, dest_key), status, value in pool.wait():
+                    source_path, dest_path = processor.source_dir / source_key, processor.source_dir / dest_key
+                    if status == 'ok':
+                        ok, elapsed, hashes, reason = value
+                    else:
+                        reason = processor.worker_failure(str(source_path), status, value)
+                        elapsed = processor.settings.image_timeout if status == 'timeout' else 0.0
+                        ok, hashes = False, None
+                    processor.record_result(source_path, dest_path, ok, elapsed, hashes, reason)
+                    queue.complete(source_key, ok)
+    
+    def process_archive(self, archive_in: Optional[str], archive_out: Optional[str]) -> None:
+        """Stream images from an archive and/or into an archive without unpacking to disk"""
+        from archive_utils import ArchiveProcessor, is_archive
+        
+        for path in (archive_in, archive_out):
+            if path and not is_archive(Path(path)):
+                print(f"Not a zip/tar archive: {path}")
+                return
+        if archive_in and not Path(archive_in).exists():
+            print(f"Archive not found: {archive_in}")
+            return
+        
+        print(f"Archive run: {archive_in or self.image_processor.source_dir} -> "
+              f"{archive_out or 'directory next to the archive'}")
+        ArchiveProcessor(self.image_processor).process(
+            Path(archive_in) if archive_in else None,
+            Path(archive_out) if archive_out else None
+        )
+    
+    def find_duplicates(self) -> None:
+        """Report groups of near-duplicate images from the perceptual hash index"""
+        from image_hashes import HashIndex
+        
+        settings = self.image_processor.settings
+        
+        # Output names are unique per folder, so look up sizes from the _resized folders
+        sizes = {}
+        for folder in self.image_processor.source_dir.rglob(f"*{settings.destination_suffix}"):
+            for image_file in folder.glob("*.webp"):
+                sizes[image_file.name] = image_file.stat().st_size
+        
+        # Fold the nodes' part files into the index and drop hashes of deleted outputs;
+        # with no outputs found at all (e.g. wrong SOURCE_DIR) nothing is dropped
+        index = HashIndex(settings.hash_index_file)
+        index.compact(keep=sizes or None)
+        groups = index.find_duplicate_groups(settings.duplicate_distance)
+        
+        print("=" * 50)
+        print(f"DUPLICATE REPORT ({len(index.entries)} indexed images, "
+              f"max distance {settings.duplicate_distance})")
+        print("=" * 50)
+        
+        reclaimable = 0
+        for group in groups:
+            print(f"🔁 {len(group)} near-identical images")
+            for name in group:
+                print(f"     - {name}")
+            # Everything but one image per group could be pruned
+            reclaimable += sum(sizes.get(name, 0) for name in group[1:])
+        
+        print("=" * 50)
+        print(f"TOTAL: {len(groups)} groups, {sum(len(g) - 1 for g in groups)} redundant images, "
+              f"{self.folder_utils.format_size(reclaimable)} reclaimable")
+        print("=" * 50)
+    
+    def write_manifest(self, manifest_path: str) -> None:
+        """Write this node's manifest and run report"""
+        self.image_processor.manifest.write(Path(manifest_path))
+        print(f"Manifest written: {manifest_path}")
+    
+    def merge_manifests(self, manifest_paths: List[str], output_path: Optional[str]) -> None:
+        """Merge per-shard manifests into one combined manifest and report"""
+        merged = merge_manifests([Path(p) for p in manifest_paths])
+        report = merged['report']
+        
+        print("=" * 50)
+        print(f"Merged {len(manifest_paths)} manifests from {len(merged['workers'])} workers")
+        print(f"Shards: {', '.join(merged['shards']) or 'unsharded'}")
+        print(f"Processed: {report['processed']}  Errors: {report['errors']}")
+        print(f"Input: {self.folder_utils.format_size(report['bytes_in'])}  "
+              f"Output: {self.folder_utils.format_size(report['bytes_out'])}")
+        print(f"Wall time: {report['elapsed_seconds']}s  CPU time: {report['cpu_seconds']}s")
+        if report['duplicates']:
+            print(f"Items processed more than once: {report['duplicates']}")
+        if report.get('quarantined'):
+            print(f"Quarantined: {len(report['quarantined'])}")
+            for item in report['quarantined']:
+                print(f"     - {item['source']} ({item['reason']})")
+        if report.get('missing_shards'):
+            print(f"Missing shards: {', '.join(report['missing_shards'])}")
+        print("=" * 50)
+        
+        if output_path:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, indent=2)
+            print(f"Merged manifest written: {output_path}")
+    
     def dry_run(self) -> None:
         """Show what would be processed without actually processing"""
         print("DRY RUN - No files will be modified")
@@ -126,17 +339,86 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Show what would be processed without processing")
     parser.add_argument("--interactive", "-i", action="store_true", help="Interactive mode")
     parser.add_argument("--discover", "-d", action="store_true", help="Discover and show image statistics")
+    parser.add_argument("--find-duplicates", action="store_true",
+                        help="Report near-duplicate images from the perceptual hash index")
+    parser.add_argument("--shard", help="Process only shard INDEX/COUNT of the images (e.g. 0/4)")
+    parser.add_argument("--queue", help="Shared SQLite queue file for dynamic work-stealing between nodes")
+    parser.add_argument("--crop-aspect", metavar="W:H",
+                        help="Smart-crop every image to this aspect ratio (e.g. 4:3, 1:1) before resizing")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="Time budget; highest-priority images run first and the run stops cleanly")
+    parser.add_argument("--workers", "-w", type=int, default=config.WORKERS,
+                        help="Number of worker processes")
+    parser.add_argument("--image-timeout", type=float, metavar="SECONDS",
+                        help=f"Per-image time limit enforced in worker processes "
+                             f"(default {config.IMAGE_TIMEOUT}; 0 disables it)")
+    parser.add_argument("--archive-in", metavar="ARCHIVE",
+                        help="Read images directly from a zip/tar archive instead of the source folder")
+    parser.add_argument("--archive-out", metavar="ARCHIVE",
+                        help="Write processed images into a zip/tar archive (.zip, .tar, .tar.gz, ...)")
+    parser.add_argument("--progress", action=argparse.BooleanOptionalAction, default=None,
+                        help="Show a live progress bar (default: only when attached to a terminal)")
+    parser.add_argument("--status-file", metavar="PATH",
+                        help="Keep a JSON status file with progress counters updated during the run")
+    parser.add_argument("--status-port", type=int, metavar="PORT",
+                        help="Serve progress on http://127.0.0.1:PORT/status (JSON) and /metrics (Prometheus)")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], type=str.upper,
+                        help=f"Log level for this run (default {config.LOG_LEVEL}; DEBUG logs every image)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile a sample of images (cProfile + tracemalloc) and report top functions and allocators")
+    parser.add_argument("--profile-sample-rate", type=float, metavar="RATE",
+                        help=f"Fraction of images to profile (default {config.PROFILE_SAMPLE_RATE})")
+    parser.add_argument("--manifest", help="Write a manifest and run report (JSON) to this path")
+    parser.add_argument("--merge-manifests", nargs="+", metavar="MANIFEST",
+                        help="Merge per-shard manifests; the result is written to --manifest if given")
     
     args = parser.parse_args()
     
-    processor = BatchProcessor()
+    if args.merge_manifests:
+        BatchProcessor().merge_manifests(args.merge_manifests, args.manifest)
+        return
+    
+    setup_logging(level=args.log_level)
+    try:
+        processor = BatchProcessor()
+    except ValueError as e:
+        parser.error(f"Invalid configuration: {e}")
+    apply_pixel_limit(processor.image_processor.settings)
+    
+    if args.shard:
+        try:
+            processor.set_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    processor.set_workers(args.workers)
+    if args.image_timeout is not None:
+        processor.set_image_timeout(args.image_timeout)
+    processor.set_progress(args.progress, args.status_file, args.status_port)
+    if args.crop_aspect:
+        try:
+            processor.set_crop_aspect(args.crop_aspect)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.deadline:
+        processor.set_deadline(args.deadline)
+    if args.profile:
+        if args.profile_sample_rate is not None and not 0 < args.profile_sample_rate <= 1:
+            parser.error("--profile-sample-rate must be in (0, 1]")
+        processor.start_profiling(args.profile_sample_rate)
     
     if args.discover:
         processor.folder_utils.print_discovery_report()
+    elif args.find_duplicates:
+        processor.find_duplicates()
     elif args.dry_run:
         processor.dry_run()
     elif args.interactive:
         processor.interactive_mode()
+    elif args.archive_in or args.archive_out:
+        processor.process_archive(args.archive_in, args.archive_out)
+    elif args.queue:
+        processor.process_from_queue(args.queue)
     elif args.folder:
         processor.process_single_folder(args.folder)
     elif args.format:
@@ -144,6 +426,12 @@ def main():
     else:
         # Default: process all folders
         processor.process_all_folders()
+    
+    if args.manifest:
+        processor.write_manifest(args.manifest)
+    if args.profile:
+        processor.write_profile_report()
+    processor.image_processor.progress.close()
 
 if __name__ == "__main__":
     main()
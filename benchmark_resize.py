@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark resize strategies on a synthetic corpus
+Compares throughput and quality (PSNR against a plain Lanczos resize) for each strategy
+"""
+
+import io
+import time
+import random
+import argparse
+from typing import List, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+import config
+from resize_strategy import ResizeStrategy
+
+# Strategies compared by default: (label, filter, reducing_gap, jpeg_draft)
+STRATEGIES = [
+    ("lanczos (baseline)", "lanczos", None, False),
+    ("lanczos + reduce", "lanczos", 2.0, False),
+    ("lanczos + reduce + draft", "lanczos", 2.0, True),
+    ("bicubic + reduce", "bicubic", 2.0, False),
+    ("bicubic + reduce + draft", "bicubic", 2.0, True),
+    ("bilinear + reduce", "bilinear", 2.0, False),
+    ("hamming + reduce", "hamming", 2.0, False),
+]
+
+# Source sizes in the synthetic corpus, from small images that need no resize to large banners
+CORPUS_SIZES = [(800, 600), (1600, 1000), (3000, 2000), (6000, 4000), (9000, 6000)]
+
+
+def make_corpus(count: int, seed: int = 42) -> List[Tuple[str, bytes]]:
+    """Encoded synthetic print images: gradients, shapes, text-like detail and noise"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        width, height = CORPUS_SIZES[i % len(CORPUS_SIZES)]
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+        noise = np.random.default_rng(seed + i).normal(0, 12, (height, width))
+        base = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        img = Image.merge('RGB', (Image.fromarray(base),
+                                  Image.fromarray(base[:, ::-1].copy()),
+                                  Image.fromarray(np.full_like(base, 128))))
+
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(width), rng.randrange(height)
+            size = rng.randrange(20, max(21, width // 6))
+            color = tuple(rng.randrange(256) for _ in range(3))
+            draw.rectangle([x, y, x + size, y + size // 3], fill=color)
+        for row in range(0, height, max(8, height // 60)):
+            draw.line([(0, row), (width, row + rng.randrange(-4, 5))], fill=(20, 20, 20), width=1)
+        img = img.filter(ImageFilter.SMOOTH)
+
+        encoded = io.BytesIO()
+        fmt = 'JPEG' if i % 2 == 0 else 'PNG'
+        img.save(encoded, format=fmt, quality=92)
+        corpus.append((fmt, encoded.getvalue()))
+    return corpus
+
+
+def target_size(width: int, height: int) -> Tuple[int, int]:
+    """Fit inside MAX_WIDTH x MAX_HEIGHT, as the processor does"""
+    if width <= config.MAX_WIDTH and height <= config.MAX_HEIGHT:
+        return width, height
+    scale = min(config.MAX_WIDTH / width, config.MAX_HEIGHT / height)
+    return int(width * scale), int(height * scale)
+
+
+def render(data: bytes, strategy: ResizeStrategy) -> Image.Image:
+    """Decode and resize one corpus image with a strategy"""
+    with Image.open(io.BytesIO(data)) as img:
+        full_size = img.size
+        strategy.prepare(img, (config.MAX_WIDTH, config.MAX_HEIGHT))
+        img = img.convert('RGB')
+        return strategy.resize(img, target_size(*full_size))
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    """Peak signal-to-noise ratio between two images of the same size, in dB"""
+    diff = np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)
+    mse = float(np.mean(diff * diff))
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def run_benchmark(count: int, repeat: int) -> None:
+    """Run every strategy over the corpus and print a comparison table"""
+    print(f"Building synthetic corpus of {count} images...")
+    corpus = make_corpus(count)
+    sizes = [Image.open(io.BytesIO(data)).size for _, data in corpus]
+    megapixels = sum(width * height for width, height in sizes) / 1e6
+
+    baseline = ResizeStrategy('lanczos')
+    references = [render(data, baseline) for _, data in corpus]
+
+    print("=" * 78)
+    print(f"{'Strategy':<28}{'images/s':>10}{'MP/s':>10}{'speedup':>10}{'PSNR dB':>10}{'min dB':>10}")
+    print("=" * 78)
+
+    baseline_rate = None
+    for label, filter_name, reducing_gap, jpeg_draft in STRATEGIES:
+        strategy = ResizeStrategy(filter_name, reducing_gap, jpeg_draft)
+
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs = [render(data, strategy) for _, data in corpus]
+            best = min(best, time.perf_counter() - start)
+
+        scores = [psnr(out, ref) for out, ref in zip(outputs, references)]
+        finite = [score for score in scores if score != float('inf')]
+        rate = len(corpus) / best
+        baseline_rate = baseline_rate or rate
+        mean_score = sum(finite) / len(finite) if finite else float('inf')
+        min_score = min(finite) if finite else float('inf')
+
+        print(f"{label:<28}{rate:>10.1f}{megapixels / best:>10.1f}{rate / baseline_rate:>9.2f}x"
+              f"{mean_score:>10.1f}{min_score:>10.1f}")
+
+    print("=" * 78)
+    print("PSNR is measured against the plain Lanczos resize; higher is closer (inf = identical).")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark resize strategies")
+    parser.add_argument("--count", type=int, default=20, help="Number of synthetic images")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    run_benchmark(args.count, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 Configuration file for image processing
 """
 import os
+import copy
 
 # Source and destination paths
 SOURCE_DIR = "/home/victor/Music/print pictures"
@@ -10,6 +11,9 @@ DESTINATION_SUFFIX = "_resized"
 # Image processing settings
 TARGET_FORMAT = "WEBP"
 QUALITY = 85
+# WebP encoder effort (0 fastest, 6 smallest); 4 is Pillow's default for still images
+# and is used for animation frames too
+WEBP_METHOD = 4
 MAX_WIDTH = 1920
 MAX_HEIGHT = 1080
 
@@ -32,3 +36,142 @@ FOLDER_NAME_MAPPING = {
 # Logging configuration
 LOG_LEVEL = "INFO"
 LOG_FILE = "image_processing.log"
+# Write the log file as JSON lines (one object per record); False writes plain text
+LOG_JSON = True
+# Rotate the log file at this size, keeping LOG_BACKUP_COUNT old files; None never rotates
+LOG_MAX_BYTES = 20 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Seconds between aggregate progress lines (per-image lines are logged at DEBUG level)
+LOG_PROGRESS_INTERVAL = 10.0
+
+# Distributed processing settings
+# Seconds after which a claimed queue item is considered abandoned and can be re-claimed
+QUEUE_LEASE_SECONDS = 600
+
+# Scheduling settings
+# Categories (top-level folder names) with a higher priority are processed first
+CATEGORY_PRIORITY = {
+    "business cards": 10,
+    "stickers and labels": 5,
+    "banners and large formats": 1
+}
+DEFAULT_PRIORITY = 3
+# Files modified within this many hours are processed before older ones of the same priority
+SCHEDULE_RECENT_HOURS = 24
+# Cost estimate used for largest-first ordering: "bytes" (file size) or "pixels" (reads
+# every image header before the run starts, which is slow on network storage)
+SCHEDULE_COST = "bytes"
+# Number of worker processes (1 = process serially)
+WORKERS = 1
+# Order jobs with the scheduler; when disabled, jobs run in discovery order
+SCHEDULE_JOBS = True
+
+# Folder restructuring settings
+# Moves executed per journaled batch
+RENAME_BATCH_SIZE = 500
+# Parallel copies for moves that cross filesystems
+RENAME_COPY_WORKERS = 8
+# Undo journals for folder restructuring runs
+RENAME_JOURNAL_DIR = "rename_journals"
+
+# Perceptual hash settings
+# Compute aHash/dHash/pHash for every processed image
+COMPUTE_HASHES = True
+# Index of perceptual hashes, keyed by output file name
+HASH_INDEX_FILE = "image_hashes.json"
+# Maximum pHash Hamming distance (out of 64 bits) for two images to count as near-duplicates
+DUPLICATE_DISTANCE = 6
+
+# Smart crop settings
+# Aspect ratio to crop every image to, e.g. "4:3" or "1:1"; None keeps the whole image
+CROP_ASPECT = None
+# Per-category aspect ratios (top-level folder names), overriding CROP_ASPECT
+CROP_ASPECT_BY_CATEGORY = {
+    # "business cards": "1:1",
+}
+# Short side, in pixels, of the proxy image used to find the most salient crop
+CROP_PROXY_SIZE = 128
+# Preference for centred crops when the image has little detail (0 = none)
+CROP_CENTER_BIAS = 0.05
+
+# Resize strategy settings
+# Final resampling filter: nearest, box, bilinear, hamming, bicubic or lanczos
+RESIZE_FILTER = "lanczos"
+# Per-category filters (top-level folder names), overriding RESIZE_FILTER
+RESIZE_FILTER_BY_CATEGORY = {
+    # "banners and large formats": "bicubic",
+}
+# Large downscales are first reduced by integer factors until within this factor of the
+# target, then finished with the filter above; None resamples the full image directly
+RESIZE_REDUCING_GAP = 2.0
+# Let JPEG images decode at a reduced scale when they are much larger than MAX_WIDTH x MAX_HEIGHT
+RESIZE_JPEG_DRAFT = True
+
+# Animation settings
+# Keep animated GIF/WebP sources animated (False keeps only the first frame)
+ANIMATED_OUTPUT = True
+# Drop frames to stay at or below this frame rate; None keeps every frame
+ANIMATION_MAX_FPS = 15
+# Truncate animations after this many output frames; None for no limit
+ANIMATION_MAX_FRAMES = 300
+# Truncate animations once this many bytes of rendered frame data were encoded; None for no limit
+ANIMATION_MAX_BYTES = 512 * 1024 * 1024
+
+# Progress reporting settings
+# Terminal progress bar on stderr: True, False, or None to show it only on a terminal
+PROGRESS_BAR = None
+# JSON status file rewritten every PROGRESS_STATUS_INTERVAL seconds during a run; None disables it
+PROGRESS_STATUS_FILE = None
+PROGRESS_STATUS_INTERVAL = 5.0
+# Local HTTP endpoint serving /status (JSON) and /metrics (Prometheus); None disables it
+PROGRESS_HOST = "127.0.0.1"
+PROGRESS_PORT = None
+
+# Input safety settings
+# Images whose header declares more pixels than this are rejected before decoding
+# (also used as Pillow's decompression-bomb limit); None disables the check
+MAX_IMAGE_PIXELS = 100_000_000
+# Seconds one image may take before its worker process is killed; None runs serial
+# jobs in-process without a timeout
+IMAGE_TIMEOUT = 120
+# Address-space limit per worker process in MB (Unix only); None for no limit
+WORKER_MEMORY_LIMIT_MB = None
+# Bad inputs (unreadable, over the pixel limit, timed out, crashed a worker) are
+# copied here, keeping their folder structure; None only records them in the manifest
+QUARANTINE_DIR = "quarantine"
+# Move bad inputs instead of copying them, so later runs skip them
+QUARANTINE_MOVE = False
+
+# Profiling settings (--profile)
+# Profile with cProfile and tracemalloc in every process
+PROFILE = False
+# Fraction of process_image calls that are profiled; discovery is always profiled
+PROFILE_SAMPLE_RATE = 0.1
+# Per-process profile data and the merged report are written below this folder
+PROFILE_DIR = "profiles"
+# Stack frames kept per traced allocation, and rows per report section
+PROFILE_TRACE_FRAMES = 1
+PROFILE_TOP = 25
+
+
+class Settings:
+    """
+    Processing settings for one ImageProcessor.
+    Every upper-case value in this module becomes a lower-case attribute
+    (SOURCE_DIR -> source_dir), read when the object is created; keyword
+    arguments override individual values.
+    """
+
+    def __init__(self, **overrides):
+        for name, value in globals().items():
+            if name.isupper():
+                setattr(self, name.lower(), copy.copy(value))
+
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={value!r}" for name, value in sorted(vars(self).items()))
+        return f"Settings({values})"
@@ -4,54 +4,73 @@ Fix folder structure - move processed images to main _resized folders
 """
 
 import os
-import shutil
+import argparse
 from pathlib import Path
 import config
+from rename_plan import RenamePlan, default_journal_path, undo_journal
+
+def plan_folder_structure(source_dir: Path) -> RenamePlan:
+    """Plan moving all processed images to the correct main _resized folders"""
+    plan = RenamePlan()
 
-def fix_folder_structure():
-    """Move all processed images to the correct main _resized folders"""
-    source_dir = Path(config.SOURCE_DIR)
-    
-    print("Fixing folder structure...")
-    print(f"Source directory: {source_dir}")
-    
     # Find all _resized folders
     resized_folders = []
     for root, dirs, files in os.walk(source_dir):
         for dir_name in dirs:
             if dir_name.endswith('_resized'):
                 resized_folders.append(Path(root) / dir_name)
-    
+
     print(f"Found {len(resized_folders)} _resized folders")
-    
-    # Process each _resized folder
+
     for resized_folder in resized_folders:
-        print(f"\nProcessing: {resized_folder}")
-        
         # Find the main category folder (parent of parent)
         main_category = resized_folder.parent.parent
         main_resized_folder = main_category / f"{main_category.name}_resized"
-        
-        # Create main resized folder if it doesn't exist
-        main_resized_folder.mkdir(exist_ok=True)
-        
+
+        if main_resized_folder == resized_folder:
+            continue
+
         # Move all webp files from subfolder to main folder
-        webp_files = list(resized_folder.glob("*.webp"))
-        print(f"  Found {len(webp_files)} WebP files")
-        
-        for webp_file in webp_files:
-            dest_file = main_resized_folder / webp_file.name
-            print(f"  Moving: {webp_file.name}")
-            shutil.move(str(webp_file), str(dest_file))
-        
-        # Remove empty subfolder
-        try:
-            resized_folder.rmdir()
-            print(f"  Removed empty folder: {resized_folder}")
-        except OSError:
-            print(f"  Could not remove folder (not empty): {resized_folder}")
-    
-    print("\nFolder structure fix completed!")
+        for webp_file in resized_folder.glob("*.webp"):
+            plan.add(webp_file, main_resized_folder / webp_file.name)
+
+        # Remove the subfolder once it is empty
+        plan.cleanup_dirs.append(resized_folder)
+
+    plan.check_collisions()
+    return plan
+
+def fix_folder_structure(dry_run: bool = False) -> None:
+    """Move all processed images to the correct main _resized folders"""
+    source_dir = Path(config.SOURCE_DIR)
+
+    print("Fixing folder structure...")
+    print(f"Source directory: {source_dir}")
+
+    plan = plan_folder_structure(source_dir)
+    plan.print_summary()
+
+    if dry_run:
+        print("\nDry run - nothing was moved")
+        return
+
+    journal_path = default_journal_path()
+    moved = plan.execute(journal_path)
+
+    print(f"\nMoved {moved} files (undo with: {Path(__file__).name} --undo {journal_path})")
+    print("Folder structure fix completed!")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Move processed images to main _resized folders")
+    parser.add_argument("--dry-run", action="store_true", help="Show the move plan without moving anything")
+    parser.add_argument("--undo", metavar="JOURNAL", help="Reverse the moves recorded in a journal")
+    args = parser.parse_args()
+
+    if args.undo:
+        print(f"Undid {undo_journal(Path(args.undo))} moves")
+    else:
+        fix_folder_structure(args.dry_run)
 
 if __name__ == "__main__":
-    fix_folder_structure()
+    main()
@@ -3,12 +3,66 @@
 Fix folder structure v2 - properly organize images by category
 """
 
-import os
-import shutil
+import argparse
 from pathlib import Path
 import config
+from rename_plan import PrefixIndex, RenamePlan, default_journal_path, undo_journal
 
-def fix_folder_structure_v2():
+# Category mapping based on filename prefixes
+CATEGORY_PREFIXES = {
+    'photo_specialty': 'photo and speciality',
+    'acrylic_paints': 'photo and speciality',
+    'canvas_prints': 'photo and speciality', 
+    'mounted_photos': 'photo and speciality',
+    'photo_calenders': 'photo and speciality',
+    'marketing': 'marketing and promotional materials',
+    'a4_flyers': 'marketing and promotional materials',
+    'custom_notebooks': 'marketing and promotional materials',
+    'trifold_bronchures': 'marketing and promotional materials',
+    'a3__posters': 'marketing and promotional materials',
+    'promotional': 'promotional products and giveaways',
+    'water_bottles': 'promotional products and giveaways',
+    'custom_pens': 'promotional products and giveaways',
+    'custom_mugs_': 'promotional products and giveaways',
+    'custom_t-shirts': 'promotional products and giveaways',
+    'stickers': 'stickers and labels',
+    'car_decals_': 'stickers and labels',
+    'vinyl_stickers': 'stickers and labels',
+    'window_decals_': 'stickers and labels',
+    'product_labels': 'stickers and labels',
+    'banners': 'banners and large formats',
+    'backdrop_banners': 'banners and large formats',
+    'vinyl_banners': 'banners and large formats',
+    'custom_flags': 'banners and large formats',
+    'roll_up_banners': 'banners and large formats',
+    'business_cards': 'business cards',
+    'standard_business_cards': 'business cards',
+    'folded_business_cards': 'business cards',
+    'custom_envelopes': 'business cards',
+    'letterheads': 'business cards',
+    'spot_uv_business_cards': 'business cards',
+    'presentation_folders': 'business cards'
+}
+
+def plan_folder_structure_v2(source_dir: Path, all_resized_dir: Path) -> RenamePlan:
+    """Plan moving every consolidated image into its category _resized folder"""
+    plan = RenamePlan()
+    # Longest matching prefix wins, so the order of CATEGORY_PREFIXES does not matter
+    prefixes = PrefixIndex(CATEGORY_PREFIXES)
+    
+    for webp_file in all_resized_dir.glob("*.webp"):
+        category = prefixes.match(webp_file.name)
+        if not category:
+            plan.add_unknown(webp_file)
+            continue
+        plan.add(webp_file, source_dir / f"{category}_resized" / webp_file.name)
+    
+    # Remove the consolidated folder once it is empty
+    plan.cleanup_dirs.append(all_resized_dir)
+    plan.check_collisions()
+    return plan
+
+def fix_folder_structure_v2(dry_run: bool = False):
     """Properly organize images by category in separate _resized folders"""
     source_dir = Path(config.SOURCE_DIR)
     all_resized_dir = source_dir / "print pictures_resized"
@@ -21,78 +75,18 @@ def fix_folder_structure_v2():
     print(f"Source directory: {source_dir}")
     print(f"All resized directory: {all_resized_dir}")
     
-    # Get all webp files
-    webp_files = list(all_resized_dir.glob("*.webp"))
-    print(f"Found {len(webp_files)} WebP files to reorganize")
+    plan = plan_folder_structure_v2(source_dir, all_resized_dir)
+    plan.print_summary()
     
-    # Create category mapping based on filename prefixes
-    categories = {
-        'photo_specialty': 'photo and speciality',
-        'acrylic_paints': 'photo and speciality',
-        'canvas_prints': 'photo and speciality', 
-        'mounted_photos': 'photo and speciality',
-        'photo_calenders': 'photo and speciality',
-        'marketing': 'marketing and promotional materials',
-        'a4_flyers': 'marketing and promotional materials',
-        'custom_notebooks': 'marketing and promotional materials',
-        'trifold_bronchures': 'marketing and promotional materials',
-        'a3__posters': 'marketing and promotional materials',
-        'promotional': 'promotional products and giveaways',
-        'water_bottles': 'promotional products and giveaways',
-        'custom_pens': 'promotional products and giveaways',
-        'custom_mugs_': 'promotional products and giveaways',
-        'custom_t-shirts': 'promotional products and giveaways',
-        'stickers': 'stickers and labels',
-        'car_decals_': 'stickers and labels',
-        'vinyl_stickers': 'stickers and labels',
-        'window_decals_': 'stickers and labels',
-        'product_labels': 'stickers and labels',
-        'banners': 'banners and large formats',
-        'backdrop_banners': 'banners and large formats',
-        'vinyl_banners': 'banners and large formats',
-        'custom_flags': 'banners and large formats',
-        'roll_up_banners': 'banners and large formats',
-        'business_cards': 'business cards',
-        'standard_business_cards': 'business cards',
-        'folded_business_cards': 'business cards',
-        'custom_envelopes': 'business cards',
-        'letterheads': 'business cards',
-        'spot_uv_business_cards': 'business cards',
-        'presentation_folders': 'business cards'
-    }
-    
-    # Process each webp file
-    for webp_file in webp_files:
-        filename = webp_file.name
-        
-        # Find the category based on filename prefix
-        category = None
-        for prefix, main_category in categories.items():
-            if filename.startswith(prefix):
-                category = main_category
-                break
-        
-        if not category:
-            print(f"  Unknown category for: {filename}")
-            continue
-        
-        # Create category _resized folder
-        category_resized_dir = source_dir / f"{category}_resized"
-        category_resized_dir.mkdir(exist_ok=True)
-        
-        # Move file to correct category folder
-        dest_file = category_resized_dir / filename
-        print(f"  Moving {filename} -> {category}_resized/")
-        shutil.move(str(webp_file), str(dest_file))
+    if dry_run:
+        print("\nDry run - nothing was moved")
+        return
     
-    # Remove the consolidated folder if empty
-    try:
-        all_resized_dir.rmdir()
-        print(f"Removed empty consolidated folder: {all_resized_dir}")
-    except OSError:
-        print(f"Could not remove consolidated folder (not empty): {all_resized_dir}")
+    journal_path = default_journal_path()
+    moved = plan.execute(journal_path)
     
-    print("\nFolder reorganization completed!")
+    print(f"\nMoved {moved} files (undo with: {Path(__file__).name} --undo {journal_path})")
+    print("Folder reorganization completed!")
     
     # Show final structure
     print("\nFinal folder structure:")
@@ -101,5 +95,17 @@ def fix_folder_structure_v2():
         file_count = len(list(folder.glob("*.webp")))
         print(f"  {folder.name}: {file_count} images")
 
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Organize consolidated images by category")
+    parser.add_argument("--dry-run", action="store_true", help="Show the move plan without moving anything")
+    parser.add_argument("--undo", metavar="JOURNAL", help="Reverse the moves recorded in a journal")
+    args = parser.parse_args()
+    
+    if args.undo:
+        print(f"Undid {undo_journal(Path(args.undo))} moves")
+    else:
+        fix_folder_structure_v2(args.dry_run)
+
 if __name__ == "__main__":
-    fix_folder_structure_v2()
+    main()
@@ -7,11 +7,13 @@ import os
 from pathlib import Path
 from typing import List, Dict, Tuple
 import config
+import profiling
 
 class FolderUtils:
     def __init__(self):
         self.source_dir = Path(config.SOURCE_DIR)
         
+    @profiling.profiled('discover_images', always=True)
     def discover_images(self) -> Dict[str, List[Path]]:
         """Discover all images in the source directory structure"""
         images_by_folder = {}
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Perceptual hashing and near-duplicate lookup
+Computes aHash, dHash and pHash from already-resized images and keeps them in an
+index with a BK-tree for fast Hamming-distance queries
+"""
+
+import os
+import re
+import json
+import math
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Iterable
+import config
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+# Cosine table for the low-frequency DCT coefficients used by pHash
+_DCT_TABLE = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * DCT_SIZE)) for x in range(DCT_SIZE)]
+    for u in range(HASH_SIZE)
+]
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return value
+
+
+def compute_hashes(img) -> Dict[str, str]:
+    """
+    Compute aHash, dHash and pHash (64 bits each, as hex) for a PIL image.
+    Meant to be called on the already-resized image so no extra decode is needed.
+    """
+    from PIL import Image
+
+    gray = img.convert('L')
+
+    small = list(gray.resize((HASH_SIZE, HASH_SIZE), Image.Resampling.BILINEAR).getdata())
+    mean = sum(small) / len(small)
+    ahash = _bits_to_int(1 if p > mean else 0 for p in small)
+
+    wide = list(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR).getdata())
+    dhash = _bits_to_int(
+        1 if wide[row * (HASH_SIZE + 1) + col] > wide[row * (HASH_SIZE + 1) + col + 1] else 0
+        for row in range(HASH_SIZE) for col in range(HASH_SIZE)
+    )
+
+    pixels = list(gray.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.BILINEAR).getdata())
+    rows = [pixels[y * DCT_SIZE:(y + 1) * DCT_SIZE] for y in range(DCT_SIZE)]
+    # Separable 2D DCT, keeping only the top-left 8x8 low-frequency block
+    row_dct = [[sum(c * p for c, p in zip(_DCT_TABLE[u], row)) for u in range(HASH_SIZE)] for row in rows]
+    coefficients = [
+        sum(_DCT_TABLE[v][y] * row_dct[y][u] for y in range(DCT_SIZE))
+        for v in range(HASH_SIZE) for u in range(HASH_SIZE)
+    ]
+    # The DC term is excluded from the median so overall brightness does not dominate
+    median = sorted(coefficients[1:])[len(coefficients[1:]) // 2]
+    phash = _bits_to_int(1 if c > median else 0 for c in coefficients)
+
+    return {
+        'ahash': f"{ahash:016x}",
+        'dhash': f"{dhash:016x}",
+        'phash': f"{phash:016x}"
+    }
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance for radius searches"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value: int, key: str) -> None:
+        """Insert a hash with its key"""
+        node = [value, key, {}]
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, str]]:
+        """All (distance, key) pairs within radius of value"""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, key, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                results.append((distance, key))
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+class HashIndex:
+    """
+    Perceptual hashes of processed images, keyed by output file name.
+    A writer passes part (a stable node name: its shard or host) and only reads and
+    writes its own part file next to the index, e.g. image_hashes.<part>.json, so
+    nodes sharing the storage never overwrite each other's entries. Readers merge
+    the index file and every part, oldest first, so the newest hash of an image
+    wins; compact() folds the parts back into the index file.
+    """
+
+    def __init__(self, index_path: Optional[Path] = None, part: Optional[str] = None):
+        self.index_path = Path(index_path or config.HASH_INDEX_FILE)
+        self.part = part
+        self.entries: Dict[str, Dict[str, str]] = {}
+        # Part files merged into entries, with their modification times when read
+        self.loaded_parts: Dict[Path, float] = {}
+        if part is not None:
+            self.load(self.part_path(part))
+        else:
+            self.load(self.index_path)
+            for path in self.part_paths():
+                self.loaded_parts[path] = path.stat().st_mtime
+                self.load(path)
+
+    def part_path(self, part: str) -> Path:
+        """Part file of one writer"""
+        name = re.sub(r'[^A-Za-z0-9_-]', '-', part)
+        return self.index_path.with_name(f"{self.index_path.stem}.{name}{self.index_path.suffix}")
+
+    def part_paths(self) -> List[Path]:
+        """Part files of all writers, oldest first"""
+        parts = self.index_path.parent.glob(f"{self.index_path.stem}.*{self.index_path.suffix}")
+        return sorted(parts, key=lambda path: path.stat().st_mtime)
+
+    def load(self, path: Path) -> None:
+        """Merge the entries of one index or part file, if it exists"""
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries.update(json.load(f))
+
+    def update(self, entries: Dict[str, Dict[str, str]]) -> None:
+        """Add or replace entries"""
+        self.entries.update(entries)
+
+    def save(self) -> None:
+        """Write the index, or this writer's part of it, atomically"""
+        path = self.part_path(self.part) if self.part is not None else self.index_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def compact(self, keep: Optional[Iterable[str]] = None) -> None:
+        """
+        Write the merged entries to the index file and remove the part files that
+        were merged; with keep, entries for any other output name are dropped.
+        A part rewritten since it was read is left for the next compaction.
+        """
+        if self.part is not None:
+            raise ValueError("compact() needs a reader, not a writer's part")
+        if keep is not None:
+            keep = set(keep)
+            self.entries = {name: entry for name, entry in self.entries.items() if name in keep}
+        self.save()
+        for path, mtime in self.loaded_parts.items():
+            try:
+                if path.stat().st_mtime == mtime:
+                    path.unlink()
+            except OSError:
+                pass
+        self.loaded_parts = {}
+
+    def get(self, name: str, kind: str = 'phash') -> Optional[int]:
+        """Hash of one image as an integer, or None if it was never indexed"""
+        entry = self.entries.get(name)
+        return int(entry[kind], 16) if entry and kind in entry else None
+
+    def build_tree(self, kind: str = 'phash') -> BKTree:
+        """BK-tree over all indexed hashes of one kind"""
+        tree = BKTree()
+        for name, entry in self.entries.items():
+            if kind in entry:
+                tree.add(int(entry[kind], 16), name)
+        return tree
+
+    def find_duplicate_groups(self, radius: Optional[int] = None, kind: str = 'phash') -> List[List[str]]:
+        """Groups of images whose hashes are within radius of each other (transitively)"""
+        radius = config.DUPLICATE_DISTANCE if radius is None else radius
+        tree = self.build_tree(kind)
+        parent = {name: name for name in self.entries}
+
+        def find(name):
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        for name in self.entries:
+            value = self.get(name, kind)
+            if value is None:
+                continue
+            for _, other in tree.search(value, radius):
+                root_a, root_b = find(name), find(other)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+        groups: Dict[str, List[str]] = {}
+        for name in self.entries:
+            groups.setdefault(find(name), []).append(name)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1),
+                      key=lambda group: (-len(group), group[0]))
+
+
+def select_diverse(names: List[str], index: HashIndex, count: int,
+                   min_distance: Optional[int] = None) -> List[str]:
+    """
+    Pick up to count images that look as different as possible: greedy farthest-first
+    on pHash distance, so near-duplicates are only picked once no more distinct image
+    is left. With min_distance, stops early instead of picking an image within that
+    distance of one already selected. Images without a hash are treated as distinct
+    from everything.
+    """
+    remaining = sorted(names)
+    selected: List[str] = []
+
+    def distance_to_selected(name: str) -> int:
+        value = index.get(name)
+        if value is None:
+            return HASH_SIZE * HASH_SIZE
+        distances = [hamming(value, index.get(other)) for other in selected if index.get(other) is not None]
+        return min(distances) if distances else HASH_SIZE * HASH_SIZE
+
+    while remaining and len(selected) < count:
+        best = max(remaining, key=distance_to_selected)
+        if min_distance is not None and selected and distance_to_selected(best) <= min_distance:
+            break
+        selected.append(best)
+        remaining.remove(best)
+
+    return selected
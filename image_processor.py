@@ -4,32 +4,176 @@ Robust Image Processing Script
 Processes images from print pictures folder, resizes them, and converts to WebP format
 """
 
+import io
 import os
-import sys
+import json
+import struct
+import time
+import shutil
 import logging
+import warnings
 from pathlib import Path
-from PIL import Image, ImageOps
-from typing import List, Tuple, Optional
+from contextlib import contextmanager
+from PIL import Image, ImageOps, UnidentifiedImageError
+from typing import List, Tuple, Optional, Iterable
 import config
+from scheduler import JobScheduler, Deadline
+from image_hashes import HashIndex, compute_hashes
+from smart_crop import aspect_output_size, find_crop_box, parse_aspect
+from resize_strategy import ResizeStrategy, get_filter
+from animation import can_encode_animation, encode_animation, is_animated
+# Batch-only modules (run manifest, progress, worker pool, logging setup) are imported
+# where they are used, so library use through resize_api stays light
+import profiling
 
-# Setup logging
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(config.LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
+class ImageLimitError(ValueError):
+    """Raised when an image's header declares more pixels than the configured limit"""
+
+def check_pixel_limit(img: Image.Image, max_pixels: Optional[int]) -> None:
+    """Reject an opened image from its header size, before any pixel data is decoded"""
+    if max_pixels and img.size[0] * img.size[1] > max_pixels:
+        raise ImageLimitError(f"{img.size[0]}x{img.size[1]} exceeds the limit of {max_pixels} pixels")
+
+class BadImageError(Exception):
+    """Raised when Pillow cannot open or decode an input file; reason is its quarantine reason"""
+    
+    def __init__(self, reason: str, error: BaseException):
+        super().__init__(f"{error}" or type(error).__name__)
+        self.reason = reason
+
+@contextmanager
+def decoding():
+    """
+    Wrap Pillow's open/load/seek calls so that only errors raised while reading
+    the input are reported as BadImageError; errors from our own code pass through
+    """
+    try:
+        yield
+    except UnidentifiedImageError as e:
+        raise BadImageError('unreadable', e) from e
+    except Image.DecompressionBombError as e:
+        raise BadImageError('pixel_limit', e) from e
+    except OSError as e:
+        # Filesystem errors (missing file, permissions) carry an errno; decoder errors do not
+        if e.errno is not None:
+            raise
+        raise BadImageError('decode_error', e) from e
+    # EOFError is left alone: it is how Pillow signals the end of an animation's frames
+    except (SyntaxError, ValueError, struct.error) as e:
+        raise BadImageError('decode_error', e) from e
+
+def apply_pixel_limit(settings: config.Settings) -> None:
+    """
+    Make Pillow's process-wide decompression-bomb check follow max_image_pixels.
+    Changes global state, so only command-line runs and pool workers call it;
+    library use relies on check_pixel_limit alone.
+    """
+    if settings.max_image_pixels:
+        # Pillow's warning for images just over the limit is redundant since check_pixel_limit rejects them
+        Image.MAX_IMAGE_PIXELS = settings.max_image_pixels
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+
+def failure_reason(error: BaseException) -> Optional[str]:
+    """Quarantine reason for an error caused by the input file, or None for other failures"""
+    if isinstance(error, BadImageError):
+        return error.reason
+    if isinstance(error, ImageLimitError):
+        return 'pixel_limit'
+    if isinstance(error, MemoryError):
+        return 'memory'
+    return None
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only stream over a memoryview, so buffers are decoded without a copy"""
+    
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, target) -> int:
+        chunk = self.view[self.position:self.position + len(target)]
+        target[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = len(self.view) + offset
+        self.position = max(0, self.position)
+        return self.position
+    
+    def tell(self) -> int:
+        return self.position
+
+def open_source(source):
+    """Wrap an in-memory image source in a readable stream for Image.open"""
+    if isinstance(source, bytes):
+        # BytesIO shares an immutable bytes object instead of copying it
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return io.BufferedReader(BufferReader(source))
+    # Anything else is expected to be a readable file object
+    return source
+
 class ImageProcessor:
-    def __init__(self):
-        self.source_dir = Path(config.SOURCE_DIR)
+    def __init__(self, settings: Optional[config.Settings] = None):
+        self.settings = settings or config.Settings()
+        self.source_dir = Path(self.settings.source_dir)
         self.processed_count = 0
         self.error_count = 0
-        self.supported_formats = config.SUPPORTED_FORMATS
+        self.supported_formats = self.settings.supported_formats
+        # Optional (index, count) restricting this run to one deterministic shard
+        self.shard: Optional[Tuple[int, int]] = None
+        self._manifest = None
+        self.scheduler = JobScheduler(self.source_dir, self.settings) if self.settings.schedule_jobs else None
+        self.deadline = Deadline(None)
+        self.workers = self.settings.workers
+        self.skipped_count = 0
+        self.resize_strategies = {}
+        # Perceptual hashes of images processed in this run, keyed by output file name
+        self.image_hashes = {}
+        self._progress = None
+        # Quarantine reasons for failed images, keyed by source path
+        self.rejections = {}
+        self.quarantined_count = 0
+        self.validate_settings()
         
+    @property
+    def manifest(self):
+        """Run manifest, created on first use"""
+        if self._manifest is None:
+            from shard_utils import RunManifest
+            self._manifest = RunManifest()
+        return self._manifest
+    
+    @property
+    def progress(self):
+        """Progress tracker, created on first use"""
+        if self._progress is None:
+            from progress import ProgressTracker
+            self._progress = ProgressTracker(self.settings)
+        return self._progress
+    
+    def validate_settings(self) -> None:
+        """Check filter names and aspect ratios once, so a typo fails the run instead of every image"""
+        settings = self.settings
+        for filter_name in [settings.resize_filter, *settings.resize_filter_by_category.values()]:
+            get_filter(filter_name)
+        for aspect in [settings.crop_aspect, *settings.crop_aspect_by_category.values()]:
+            parse_aspect(aspect)
+    
     def is_image_file(self, file_path: Path) -> bool:
         """Check if file is a supported image format"""
         return file_path.suffix.lower() in self.supported_formats
@@ -40,17 +184,18 @@ class ImageProcessor:
             with Image.open(image_path) as img:
                 return img.size[0], img.size[1], img.format
         except Exception as e:
-            logger.error(f"Error reading image {image_path}: {e}")
+            logger.error("Error reading image %s: %s", image_path, e, extra={'image': str(image_path)})
             return None
     
     def calculate_new_dimensions(self, width: int, height: int) -> Tuple[int, int]:
         """Calculate new dimensions maintaining aspect ratio"""
-        if width <= config.MAX_WIDTH and height <= config.MAX_HEIGHT:
+        max_width, max_height = self.settings.max_width, self.settings.max_height
+        if width <= max_width and height <= max_height:
             return width, height
             
         # Calculate scaling factor
-        width_ratio = config.MAX_WIDTH / width
-        height_ratio = config.MAX_HEIGHT / height
+        width_ratio = max_width / width
+        height_ratio = max_height / height
         scale_factor = min(width_ratio, height_ratio)
         
         new_width = int(width * scale_factor)
@@ -58,107 +203,498 @@ class ImageProcessor:
         
         return new_width, new_height
     
+    @profiling.profiled('process_image')
     def process_image(self, source_path: Path, dest_path: Path) -> bool:
         """Process a single image: resize and convert to WebP"""
         try:
-            logger.info(f"Processing: {source_path.name}")
-            
-            # Get original image info
-            img_info = self.get_image_info(source_path)
-            if not img_info:
-                return False
-                
-            width, height, format_name = img_info
-            logger.info(f"Original: {width}x{height} ({format_name})")
+            logger.debug("Processing: %s", source_path.name)
             
-            # Open and process image
-            with Image.open(source_path) as img:
-                # Convert RGBA to RGB if necessary for WebP
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # Create white background
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
+            # Open and process image; only the header has been read at this point
+            with decoding():
+                img = Image.open(source_path)
+            with img:
+                width, height = img.size
+                logger.debug("Original: %dx%d (%s)", width, height, img.format)
+                check_pixel_limit(img, self.settings.max_image_pixels)
                 
-                # Calculate new dimensions
-                new_width, new_height = self.calculate_new_dimensions(width, height)
-                logger.info(f"Resizing to: {new_width}x{new_height}")
-                
-                # Resize image
-                resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                category = self.get_category(source_path)
                 
                 # Ensure destination directory exists
                 dest_path.parent.mkdir(parents=True, exist_ok=True)
                 
-                # Save as WebP
-                resized_img.save(
-                    dest_path,
-                    format='WEBP',
-                    quality=config.QUALITY,
-                    optimize=True
-                )
+                if self.settings.animated_output and is_animated(img) and can_encode_animation():
+                    data, resized_img = self.render_animation(img, category)
+                    dest_path.write_bytes(data)
+                else:
+                    resized_img = self.render_image(img, category)
+                    # Snapshot the Python-level allocations while the render is still alive;
+                    # Pillow's pixel buffers are C allocations tracemalloc does not see
+                    profiling.checkpoint()
+                    self.encode_image(resized_img, dest_path)
+                logger.debug("Resized to: %dx%d", *resized_img.size)
+                
+                if self.settings.compute_hashes:
+                    # Hash the already-downscaled image rather than decoding again
+                    self.image_hashes[dest_path.name] = compute_hashes(resized_img)
                 
-                logger.info(f"Saved: {dest_path}")
+                logger.debug("Saved: %s", dest_path, extra={'image': source_path.name,
+                                                             'width': width, 'height': height})
                 return True
                 
         except Exception as e:
-            logger.error(f"Error processing {source_path}: {e}")
+            reason = failure_reason(e)
+            if reason:
+                self.rejections[str(source_path)] = reason
+            logger.error("Error processing %s: %s", source_path, e,
+                         extra={'image': str(source_path), 'reason': reason})
             return False
     
+    def get_category(self, source_path: Path) -> Optional[str]:
+        """Top-level folder of an image below the source directory, used for per-category settings"""
+        try:
+            return source_path.relative_to(self.source_dir).parts[0]
+        except (ValueError, IndexError):
+            return None
+    
+    def get_resize_strategy(self, category: Optional[str]) -> ResizeStrategy:
+        """Resize strategy for a category, built once per category"""
+        if category not in self.resize_strategies:
+            self.resize_strategies[category] = ResizeStrategy.for_category(self.settings, category)
+        return self.resize_strategies[category]
+    
+    def get_crop_aspect(self, category: Optional[str]) -> Optional[float]:
+        """Fixed output aspect ratio for a category (or the global setting), or None"""
+        return parse_aspect(self.settings.crop_aspect_by_category.get(category, self.settings.crop_aspect))
+    
+    def get_crop_box(self, img: Image.Image, category: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+        """Smart-crop box for an image if its category (or the global setting) asks for a fixed aspect ratio"""
+        crop_aspect = self.get_crop_aspect(category)
+        if not crop_aspect:
+            return None
+        return find_crop_box(img, crop_aspect, self.settings.crop_proxy_size,
+                             self.settings.crop_center_bias)
+    
+    def render_image(self, img: Image.Image, category: Optional[str] = None) -> Image.Image:
+        """Crop an opened image to an aspect ratio if configured, convert it to RGB and resize it to fit the configured box"""
+        strategy = self.get_resize_strategy(category)
+        strategy.prepare(img, (self.settings.max_width, self.settings.max_height))
+        
+        with decoding():
+            img.load()
+        
+        # Crop the full image once, before any conversion or resampling touches the discarded area
+        crop_box = self.get_crop_box(img, category)
+        if crop_box:
+            img = img.crop(crop_box)
+        
+        return self.convert_and_resize(img, strategy, self.get_crop_aspect(category))
+    
+    def render_animation(self, img: Image.Image, category: Optional[str] = None) -> Tuple[bytes, Image.Image]:
+        """Render an animated image frame by frame into an animated WebP; returns it with the first frame"""
+        strategy = self.get_resize_strategy(category)
+        with decoding():
+            img.load()
+        # One crop window for the whole animation, chosen on the first frame
+        crop_box = self.get_crop_box(img, category)
+        crop_aspect = self.get_crop_aspect(category)
+        
+        def render_frame(frame: Image.Image) -> Image.Image:
+            with decoding():
+                frame.load()
+            if crop_box:
+                frame = frame.crop(crop_box)
+            return self.convert_and_resize(frame, strategy, crop_aspect)
+        
+        return encode_animation(img, render_frame, self.settings, guard=decoding)
+    
+    def convert_and_resize(self, img: Image.Image, strategy: ResizeStrategy,
+                           aspect: Optional[float] = None) -> Image.Image:
+        """
+        Flatten an image onto white RGB and resize it to fit the configured box;
+        with aspect (a smart-cropped image), the output keeps exactly that ratio
+        """
+        # Convert RGBA to RGB if necessary for WebP
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Create white background
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        # Resize image; images that already fit are passed through without resampling
+        if aspect:
+            size = aspect_output_size(*img.size, self.settings.max_width, self.settings.max_height, aspect)
+        else:
+            size = self.calculate_new_dimensions(*img.size)
+        return strategy.resize(img, size)
+    
+    def encode_image(self, img: Image.Image, dest) -> None:
+        """Encode a rendered image to a path or writable file object"""
+        img.save(
+            dest,
+            format=self.settings.target_format,
+            quality=self.settings.quality,
+            method=self.settings.webp_method,
+            optimize=True
+        )
+    
+    def process_bytes(self, data: bytes) -> bytes:
+        """Process an encoded image held in memory and return the encoded result"""
+        return bytes(self.process_stream(data))
+    
+    def process_stream(self, source, output=None, category: Optional[str] = None) -> Optional[memoryview]:
+        """
+        Process an image from bytes, a buffer (bytearray, memoryview) or a readable
+        file object without touching the disk. The encoded result is written to
+        output when given; otherwise a memoryview over the in-memory result is returned.
+        category selects per-category crop and resize settings, as the top-level
+        folder does for files.
+        """
+        with decoding():
+            img = Image.open(open_source(source))
+        with img:
+            check_pixel_limit(img, self.settings.max_image_pixels)
+            if self.settings.animated_output and is_animated(img) and can_encode_animation():
+                data, _ = self.render_animation(img, category)
+                if output is not None:
+                    output.write(data)
+                    return None
+                return memoryview(data)
+            # Encode before the source closes: images that need no resize are not copied
+            resized_img = self.render_image(img, category)
+            
+            if output is not None:
+                self.encode_image(resized_img, output)
+                return None
+            
+            buffer = io.BytesIO()
+            self.encode_image(resized_img, buffer)
+        # getbuffer() hands out the encoder's buffer without copying it
+        return buffer.getbuffer()
+    
+    def process_stream_batch(self, sources: Iterable, workers: int = 1) -> List[memoryview]:
+        """
+        Process several in-memory images with one processor, returning results in
+        input order. Pillow releases the GIL while decoding, resizing and encoding,
+        so workers > 1 processes images concurrently on threads.
+        """
+        if workers <= 1:
+            return [self.process_stream(source) for source in sources]
+        
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.process_stream, sources))
+    
     def get_folder_name_mapping(self, folder_name: str) -> str:
         """Get mapped folder name for renaming"""
-        return config.FOLDER_NAME_MAPPING.get(folder_name, folder_name.replace(" ", "_").lower())
+        return self.settings.folder_name_mapping.get(folder_name, folder_name.replace(" ", "_").lower())
     
-    def process_folder(self, folder_path: Path) -> None:
-        """Process all images in a folder"""
+    def relative_key(self, path: Path) -> str:
+        """Path relative to the source directory, identical on every node sharing the storage"""
+        try:
+            return path.relative_to(self.source_dir).as_posix()
+        except ValueError:
+            return path.as_posix()
+    
+    def in_shard(self, source_path: Path) -> bool:
+        """Check whether an image belongs to this run's shard"""
+        if self.shard is None:
+            return True
+        from shard_utils import shard_for_key
+        index, count = self.shard
+        return shard_for_key(self.relative_key(source_path), count) == index
+    
+    def collect_folder_jobs(self, folder_path: Path) -> List[Tuple[Path, Path]]:
+        """Collect (source, destination) pairs for all images in a folder, recursively"""
+        jobs = []
         folder_name = folder_path.name
         mapped_name = self.get_folder_name_mapping(folder_name)
+        dest_folder = folder_path.parent / f"{folder_name}{self.settings.destination_suffix}"
         
-        logger.info(f"Processing folder: {folder_name} -> {mapped_name}")
-        
-        # Create destination folder
-        dest_folder = folder_path.parent / f"{folder_name}{config.DESTINATION_SUFFIX}"
-        dest_folder.mkdir(exist_ok=True)
-        
-        # Process all images in the folder
-        for file_path in folder_path.iterdir():
+        # Sorted so every node sees the same job list regardless of directory order
+        for file_path in sorted(folder_path.iterdir()):
             if file_path.is_file() and self.is_image_file(file_path):
                 # Create new filename with folder name prefix
                 new_filename = f"{mapped_name}_{file_path.stem}.webp"
-                dest_path = dest_folder / new_filename
+                jobs.append((file_path, dest_folder / new_filename))
+            elif file_path.is_dir() and not file_path.name.endswith(self.settings.destination_suffix):
+                # Recursively collect subdirectories, skipping earlier outputs
+                jobs.extend(self.collect_folder_jobs(file_path))
+        
+        return jobs
+    
+    @profiling.profiled('discover_images', always=True)
+    def collect_all_jobs(self) -> List[Tuple[Path, Path]]:
+        """Collect jobs for every folder in the source directory"""
+        jobs = []
+        for item in sorted(self.source_dir.iterdir()):
+            if item.is_dir() and not item.name.endswith(self.settings.destination_suffix):
+                jobs.extend(self.collect_folder_jobs(item))
+        return jobs
+    
+    def record_result(self, source_path: Path, dest_path: Path, ok: bool, elapsed: float,
+                      hashes: Optional[dict] = None, reason: Optional[str] = None) -> None:
+        """Update the counters and the run manifest for a finished job, quarantining bad inputs"""
+        if hashes:
+            self.image_hashes[dest_path.name] = hashes
+        
+        if ok:
+            self.processed_count += 1
+        else:
+            self.error_count += 1
+        
+        try:
+            bytes_in = source_path.stat().st_size
+            bytes_out = dest_path.stat().st_size if ok else 0
+        except OSError:
+            bytes_in, bytes_out = 0, 0
+        
+        if reason:
+            self.quarantine(source_path, dest_path, reason)
+        
+        self.manifest.record(self.relative_key(source_path), self.relative_key(dest_path),
+                             ok, elapsed, bytes_in, bytes_out, reason)
+        self.progress.update(ok, bytes_in, bytes_out)
+    
+    def quarantine(self, source_path: Path, dest_path: Path, reason: str) -> None:
+        """Copy (or move) a bad input to the quarantine folder and note why"""
+        self.quarantined_count += 1
+        if reason in ('timeout', 'worker_crash'):
+            # The killed worker may have left a partly written output behind
+            dest_path.unlink(missing_ok=True)
+        if not self.settings.quarantine_dir:
+            return
+        
+        quarantine_dir = Path(self.settings.quarantine_dir)
+        target = quarantine_dir / self.relative_key(source_path)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if self.settings.quarantine_move:
+                shutil.move(str(source_path), str(target))
+            else:
+                shutil.copy2(source_path, target)
+            self.note_quarantine(self.relative_key(source_path), reason)
+        except OSError as e:
+            logger.error("Could not quarantine %s: %s", source_path, e)
+            return
+        logger.warning("Quarantined %s (%s)", source_path, reason,
+                       extra={'image': str(source_path), 'reason': reason})
+    
+    def quarantine_data(self, key: str, data: bytes, reason: str) -> None:
+        """Write a bad in-memory input (an archive member) to the quarantine folder and note why"""
+        self.quarantined_count += 1
+        if not self.settings.quarantine_dir:
+            return
+        
+        # Archive keys are "archive.zip:member/name.jpg"; the member keeps its folders under the archive's name
+        target = Path(self.settings.quarantine_dir) / key.replace(':', '/', 1)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+            self.note_quarantine(key, reason)
+        except OSError as e:
+            logger.error("Could not quarantine %s: %s", key, e)
+            return
+        logger.warning("Quarantined %s (%s)", key, reason, extra={'image': key, 'reason': reason})
+    
+    def note_quarantine(self, key: str, reason: str) -> None:
+        """Append a quarantined input and its reason to the quarantine log"""
+        with open(Path(self.settings.quarantine_dir) / "quarantine.jsonl", 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'source': key, 'reason': reason, 'time': round(time.time(), 3)}) + "\n")
+    
+    def process_job(self, source_path: Path, dest_path: Path) -> bool:
+        """Process one job in this process, updating the counters and the run manifest"""
+        start = time.perf_counter()
+        ok = self.process_image(source_path, dest_path)
+        reason = self.rejections.pop(str(source_path), None)
+        self.record_result(source_path, dest_path, ok, time.perf_counter() - start, reason=reason)
+        return ok
+    
+    def process_jobs(self, jobs: List[Tuple[Path, Path]]) -> None:
+        """Process a list of jobs in scheduled order, skipping those outside this run's shard"""
+        jobs = [job for job in jobs if self.in_shard(job[0])]
+        jobs = self.schedule_jobs(jobs)
+        
+        self.progress.start(len(jobs))
+        # With a timeout, even serial runs go through an isolated worker so a hang can be killed
+        if (self.workers > 1 and len(jobs) > 1) or (self.settings.image_timeout and jobs):
+            self.process_jobs_parallel(jobs)
+        else:
+            self.process_jobs_serial(jobs)
+        self.progress.finish()
+        
+        # A sharded run is one of several nodes; an unsharded directory run can fold the parts in
+        self.save_hash_index(compact=self.shard is None)
+    
+    def schedule_jobs(self, jobs: List[Tuple[Path, Path]]) -> List[Tuple[Path, Path]]:
+        """Jobs in scheduled order (discovery order when scheduling is off)"""
+        if self.scheduler is None:
+            return jobs
+        start = time.perf_counter()
+        jobs = self.scheduler.order(jobs)
+        logger.info("Scheduled %d images in %.1fs (cost by %s)", len(jobs),
+                    time.perf_counter() - start, self.settings.schedule_cost)
+        return jobs
+    
+    def process_jobs_serial(self, jobs: List[Tuple[Path, Path]]) -> None:
+        """Process jobs one after another in this process"""
+        for index, (source_path, dest_path) in enumerate(jobs):
+            if self.deadline.reached():
+                self.skip_remaining(len(jobs) - index)
+                return
+            self.process_job(source_path, dest_path)
+    
+    def process_jobs_parallel(self, jobs: List[Tuple[Path, Path]]) -> None:
+        """
+        Process jobs across isolated worker processes, keeping scheduled order for
+        submission. A job that exceeds IMAGE_TIMEOUT or crashes its worker is
+        quarantined and only that worker is restarted.
+        """
+        # One job per worker is in flight so a deadline stops the run promptly
+        next_index = 0
+        
+        with self.worker_pool(process_image_in_worker) as pool:
+            while next_index < len(jobs) or pool.busy():
+                while next_index < len(jobs) and pool.idle() and not self.deadline.reached():
+                    source_path, dest_path = jobs[next_index]
+                    pool.submit(next_index, (source_path, dest_path))
+                    next_index += 1
                 
-                if self.process_image(file_path, dest_path):
-                    self.processed_count += 1
-                else:
-                    self.error_count += 1
-            elif file_path.is_dir():
-                # Recursively process subdirectories
-                self.process_folder(file_path)
+                if not pool.busy():
+                    break
+                
+                for index, status, value in pool.wait():
+                    source_path, dest_path = jobs[index]
+                    if status == 'ok':
+                        ok, elapsed, hashes, reason = value
+                    else:
+                        reason = self.worker_failure(str(source_path), status, value)
+                        elapsed = self.settings.image_timeout if status == 'timeout' else 0.0
+                        ok, hashes = False, None
+                    self.record_result(source_path, dest_path, ok, elapsed, hashes, reason)
+        
+        if next_index < len(jobs):
+            self.skip_remaining(len(jobs) - next_index)
+    
+    def worker_pool(self, func) -> 'IsolatedWorkerPool':
+        """Isolated worker pool running func in workers set up with this run's settings"""
+        from worker_pool import IsolatedWorkerPool
+        from log_utils import worker_log_queue
+        return IsolatedWorkerPool(func, self.workers, self.settings.image_timeout,
+                                  initializer=init_worker,
+                                  initargs=(self.settings, worker_log_queue(), logging.getLogger().level),
+                                  memory_limit_mb=self.settings.worker_memory_limit_mb,
+                                  finalizer=profiling.stop if self.settings.profile else None)
+    
+    def worker_failure(self, key: str, status: str, value) -> Optional[str]:
+        """Log a job the worker pool did not finish; returns its quarantine reason, if any"""
+        if status == 'crash':
+            logger.error("Worker exited with code %s on %s", value, key, extra={'image': key})
+        elif status == 'error':
+            logger.error("Worker failed on %s: %s", key, value, extra={'image': key})
+        return {'timeout': 'timeout', 'crash': 'worker_crash'}.get(status)
+    
+    def save_hash_index(self, compact: bool = False) -> None:
+        """
+        Merge the hashes computed so far into this node's part of the on-disk hash
+        index; with compact, then fold every part into the index file
+        """
+        if not self.image_hashes:
+            return
+        # Only this node writes its part file, so concurrent nodes need no locking
+        index = HashIndex(self.settings.hash_index_file, part=self.hash_index_part())
+        index.update(self.image_hashes)
+        index.save()
+        self.image_hashes = {}
+        if compact:
+            HashIndex(self.settings.hash_index_file).compact()
+    
+    def hash_index_part(self) -> str:
+        """Stable name of this node's hash index part: its shard, or its host name"""
+        if self.shard is not None:
+            return f"shard-{self.shard[0]}"
+        import socket
+        return socket.gethostname()
+    
+    def skip_remaining(self, count: int) -> None:
+        """Record jobs left unprocessed because the deadline was reached"""
+        self.skipped_count += count
+        self.progress.skip(count)
+        logger.info("Deadline reached, %d images left unprocessed", count)
+    
+    def process_folder(self, folder_path: Path) -> None:
+        """Process all images in a folder"""
+        folder_name = folder_path.name
+        mapped_name = self.get_folder_name_mapping(folder_name)
+        
+        logger.info("Processing folder: %s -> %s", folder_name, mapped_name)
+        
+        self.process_jobs(self.collect_folder_jobs(folder_path))
     
     def process_all_folders(self) -> None:
         """Process all folders in the source directory"""
         if not self.source_dir.exists():
-            logger.error(f"Source directory does not exist: {self.source_dir}")
+            logger.error("Source directory does not exist: %s", self.source_dir)
             return
         
-        logger.info(f"Starting image processing from: {self.source_dir}")
+        logger.info("Starting image processing from: %s", self.source_dir)
+        
+        if self.shard is not None:
+            logger.info("Shard: %d/%d", *self.shard)
         
         # Process each main folder
-        for item in self.source_dir.iterdir():
-            if item.is_dir():
-                self.process_folder(item)
+        self.process_jobs(self.collect_all_jobs())
         
-        logger.info(f"Processing complete!")
-        logger.info(f"Successfully processed: {self.processed_count} images")
-        logger.info(f"Errors encountered: {self.error_count} images")
+        logger.info("Processing complete!")
+        logger.info("Successfully processed: %d images", self.processed_count)
+        logger.info("Errors encountered: %d images", self.error_count)
+        if self.quarantined_count:
+            logger.info("Quarantined: %d images (in %s)", self.quarantined_count,
+                        self.settings.quarantine_dir)
+        if self.skipped_count:
+            logger.info("Skipped (deadline): %d images", self.skipped_count)
+
+_worker_processor = None
+
+def init_worker(settings: config.Settings, log_queue=None, log_level: int = logging.INFO) -> None:
+    """Create the processor reused by a pool worker for all of its images"""
+    global _worker_processor
+    from log_utils import setup_worker_logging
+    setup_worker_logging(log_queue, log_level)
+    apply_pixel_limit(settings)
+    if settings.profile:
+        profiling.start(settings)
+    _worker_processor = ImageProcessor(settings)
+
+def process_image_in_worker(source_path: Path, dest_path: Path) -> Tuple[bool, float, Optional[dict], Optional[str]]:
+    """Process one image in a pool worker, returning its hashes and any quarantine reason to the parent"""
+    start = time.perf_counter()
+    ok = _worker_processor.process_image(source_path, dest_path)
+    elapsed = time.perf_counter() - start
+    return (ok, elapsed, _worker_processor.image_hashes.pop(dest_path.name, None),
+            _worker_processor.rejections.pop(str(source_path), None))
+
+def process_stream_in_worker(key: str, data: bytes,
+                             category: Optional[str] = None) -> Tuple[Optional[bytes], float, Optional[str]]:
+    """Process one in-memory image in a pool worker; returns the encoded bytes (None on failure), time and quarantine reason"""
+    start = time.perf_counter()
+    try:
+        encoded, reason = bytes(_worker_processor.process_stream(data, category=category)), None
+    except Exception as e:
+        encoded, reason = None, failure_reason(e)
+        logger.error("Error processing %s: %s", key, e, extra={'image': key, 'reason': reason})
+    return encoded, time.perf_counter() - start, reason
 
 def main():
     """Main function"""
+    from log_utils import setup_logging
+    setup_logging()
     processor = ImageProcessor()
+    apply_pixel_limit(processor.settings)
     processor.process_all_folders()
 
 if __name__ == "__main__":
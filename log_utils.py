@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Logging setup for command-line runs
+Records are handed to a queue and written by a background listener thread, so
+workers never block on log I/O. The log file gets one JSON object per line and
+is rotated by size; the console gets plain text.
+"""
+
+import sys
+import json
+import atexit
+import logging
+import logging.handlers
+from typing import Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else was passed via extra= and is kept as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listeners = []
+_worker_queue = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any fields passed with extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def build_handlers(settings: config.Settings):
+    """Rotating JSON file handler and plain-text console handler"""
+    if settings.log_max_bytes:
+        file_handler = logging.handlers.RotatingFileHandler(
+            settings.log_file, maxBytes=settings.log_max_bytes,
+            backupCount=settings.log_backup_count, encoding='utf-8'
+        )
+    else:
+        file_handler = logging.FileHandler(settings.log_file, encoding='utf-8')
+    if settings.log_json:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    return file_handler, console_handler
+
+
+def setup_logging(settings: Optional[config.Settings] = None, level: Optional[str] = None) -> None:
+    """
+    Configure queue-based file and console logging for a command-line run.
+    level overrides settings.log_level for this run.
+    """
+    global _worker_queue
+    import queue
+    settings = settings or config.Settings()
+    level = getattr(logging, (level or settings.log_level).upper())
+
+    stop_logging()
+    handlers = build_handlers(settings)
+
+    # In-process queue for this process; pool workers get a separate process-safe
+    # queue (see worker_log_queue) drained by a second listener into the same handlers
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _worker_queue = None
+    atexit.register(stop_logging)
+
+
+def worker_log_queue():
+    """Process-safe queue for pool workers' log records, or None when logging is not set up"""
+    global _worker_queue
+    if not _listeners:
+        return None
+    if _worker_queue is None:
+        import multiprocessing
+        _worker_queue = multiprocessing.Queue(-1)
+        listener = logging.handlers.QueueListener(_worker_queue, *_listeners[0].handlers,
+                                                  respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+    return _worker_queue
+
+
+def setup_worker_logging(log_queue, level: int) -> None:
+    """Send a pool worker's log records to the parent's listener"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if log_queue is not None:
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener threads"""
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        if not _listeners:
+            for handler in listener.handlers:
+                handler.close()
+
@@ -8,12 +8,16 @@ import os
 import shutil
 from pathlib import Path
 import re
+from image_hashes import HashIndex, select_diverse
 
 # Base paths
 FRONTEND_PUBLIC = Path("/home/victor/Music/brandingstudiopublicfrontend/public")
 PRINT_IMAGES_SOURCE = FRONTEND_PUBLIC / "print images"
 PRINT_SERVICES_APP = Path("/home/victor/Music/brandingstudiopublicfrontend/src/app/print-services")
 
+# Number of images shown per product
+IMAGES_PER_PRODUCT = 4
+
 # Image mapping based on filename prefixes to product categories
 IMAGE_MAPPING = {
     # Banners & Large Format
@@ -215,6 +219,9 @@ def organize_images():
             if not matched:
                 print(f"    No mapping found for: {filename}")
     
+    # Perceptual hashes recorded while processing, used to put the most distinct shots first
+    hash_index = HashIndex()
+    
     # Create product image folders and move images
     for prefix, mapping in IMAGE_MAPPING.items():
         if not mapping['images']:
@@ -222,17 +229,28 @@ def organize_images():
             
         print(f"\nProcessing {prefix}: {len(mapping['images'])} images")
         
+        images_by_name = {image_file.name: image_file for image_file in mapping['images']}
+        selected_names = select_diverse(list(images_by_name), hash_index, IMAGES_PER_PRODUCT)
+        mapping['selected'] = [images_by_name[name] for name in selected_names]
+        
         # Create product image folder
         product_images_dir = FRONTEND_PUBLIC / "images" / "products" / mapping['subcategory']
         product_images_dir.mkdir(parents=True, exist_ok=True)
         
         # Move and rename images
-        for i, image_file in enumerate(mapping['images'][:4], 1):  # Limit to 4 images per product
+        for i, image_file in enumerate(mapping['selected'], 1):
             new_filename = f"{mapping['subcategory']}-{i}.webp"
             dest_path = product_images_dir / new_filename
             
             print(f"  Moving: {image_file.name} -> {new_filename}")
             shutil.copy2(str(image_file), str(dest_path))
+        
+        # Remove numbered images left over from earlier runs that selected more images
+        for old_file in product_images_dir.glob(f"{mapping['subcategory']}-*.webp"):
+            number = old_file.stem[len(mapping['subcategory']) + 1:]
+            if number.isdigit() and int(number) > len(mapping['selected']):
+                print(f"  Removing stale: {old_file.name}")
+                old_file.unlink()
     
     print("\nImage organization completed!")
 
@@ -257,14 +275,15 @@ def update_product_pages():
             content = f.read()
         
         # Generate new image array
-        image_count = min(len(mapping['images']), 4)
+        image_count = len(mapping['selected'])
         new_images = []
         for i in range(1, image_count + 1):
             new_images.append(f"      '/images/products/{mapping['subcategory']}-{i}.webp'")
         
         # Replace images array
         images_pattern = r"images:\s*\[[^\]]*\]"
-        new_images_text = f"images: [\n{',\n'.join(new_images)}\n    ]"
+        joined_images = ',\n'.join(new_images)
+        new_images_text = f"images: [\n{joined_images}\n    ]"
         
         updated_content = re.sub(images_pattern, new_images_text, content, flags=re.MULTILINE | re.DOTALL)
         
@@ -288,7 +307,7 @@ def main():
     print("\nSummary:")
     for prefix, mapping in IMAGE_MAPPING.items():
         if mapping['images']:
-            image_count = min(len(mapping['images']), 4)
+            image_count = len(mapping['selected'])
             print(f"  {mapping['subcategory']}: {image_count} images")
 
 if __name__ == "__main__":
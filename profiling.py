@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Sampling profiler for batch runs
+Profiles a sample of calls to the decorated functions with cProfile and
+tracemalloc in every process (parent and workers), dumps per-process results to
+a profile directory and merges them into one report of top functions and top
+allocation sites. cProfile, tracemalloc and pstats are imported only when
+profiling starts, so the decorators cost nothing to import.
+"""
+
+import os
+import io
+import json
+import math
+import time
+import functools
+from pathlib import Path
+from typing import Dict, Optional
+import config
+
+# The profiler of this process, or None when profiling is off
+_active = None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS mark for this process (Linux); False when unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def rss_status() -> Optional[Dict[str, int]]:
+    """Current and peak resident set size in bytes from /proc, or None when unavailable"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return {'rss': int(fields['VmRSS'].split()[0]) * 1024,
+                'peak': int(fields['VmHWM'].split()[0]) * 1024}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def max_rss() -> int:
+    """Lifetime peak RSS of this process in bytes via getrusage; 0 when unavailable"""
+    try:
+        import sys
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    """cProfile and tracemalloc around sampled calls in one process"""
+
+    def __init__(self, profile_dir: Path, sample_rate: float, trace_frames: int = 1):
+        import cProfile
+        self.profile_dir = Path(profile_dir)
+        self.sample_rate = sample_rate
+        self.trace_frames = trace_frames
+        self.profile = cProfile.Profile()
+        self.calls: Dict[str, int] = {}
+        self.samples: Dict[str, int] = {}
+        # label -> {allocation site: [bytes, blocks]} summed over sampled calls
+        self.allocations: Dict[str, Dict[str, list]] = {}
+        # label -> [peak tracemalloc bytes of each sampled call]; Python and NumPy only
+        self.peaks: Dict[str, list] = {}
+        # label -> [peak RSS growth of each sampled call], which includes Pillow's C buffers
+        self.rss_peaks: Dict[str, list] = {}
+        self.rss_start = 0
+        self.rss_exact = False
+        self.current: Optional[str] = None
+        self.snapshot = None
+
+    def sampled(self, label: str, always: bool = False) -> bool:
+        """
+        Deterministically pick sample_rate of the calls for a label, starting with
+        the first, so short-lived workers and small runs still get samples
+        """
+        calls = self.calls.get(label, 0) + 1
+        self.calls[label] = calls
+        if always:
+            return True
+        return math.floor((calls - 1) * self.sample_rate) != math.floor((calls - 2) * self.sample_rate)
+
+    def enter(self, label: str) -> None:
+        import tracemalloc
+        self.current = label
+        self.snapshot = None
+        # With a resettable peak mark the growth is exact; otherwise only new lifetime peaks show up
+        self.rss_exact = reset_peak_rss() and rss_status() is not None
+        self.rss_start = rss_status()['rss'] if self.rss_exact else max_rss()
+        tracemalloc.start(self.trace_frames)
+        self.profile.enable()
+
+    def checkpoint(self) -> None:
+        """Keep a snapshot of the Python allocations alive now, instead of those left at return"""
+        import tracemalloc
+        self.profile.disable()
+        self.snapshot = tracemalloc.take_snapshot()
+        self.profile.enable()
+
+    def exit(self) -> None:
+        import tracemalloc
+        self.profile.disable()
+        snapshot = self.snapshot or tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rss_peak = rss_status()['peak'] if self.rss_exact else max_rss()
+
+        label = self.current
+        self.current = None
+        self.snapshot = None
+        self.samples[label] = self.samples.get(label, 0) + 1
+        self.peaks.setdefault(label, []).append(peak)
+        self.rss_peaks.setdefault(label, []).append(max(0, rss_peak - self.rss_start))
+        sites = self.allocations.setdefault(label, {})
+        # Leave out the profiler's own bookkeeping
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                           tracemalloc.Filter(False, __file__)])
+        for stat in snapshot.statistics('lineno'):
+            frame = stat.traceback[0]
+            site = sites.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+            site[0] += stat.size
+            site[1] += stat.count
+        self.dump()
+
+    def dump(self) -> None:
+        """Write this process's results so far (overwritten after every sample)"""
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        name = f"process-{os.getpid()}"
+        self.profile.dump_stats(str(self.profile_dir / f"{name}.prof"))
+        with open(self.profile_dir / f"{name}.alloc.json", 'w', encoding='utf-8') as f:
+            json.dump({'calls': self.calls, 'samples': self.samples,
+                       'peaks': self.peaks, 'rss_peaks': self.rss_peaks,
+                       'allocations': self.allocations}, f)
+
+
+def start(settings: config.Settings) -> None:
+    """Turn on sampling in this process"""
+    global _active
+    _active = Profiler(settings.profile_dir, settings.profile_sample_rate, settings.profile_trace_frames)
+
+
+def stop() -> None:
+    """Write the remaining results of this process and turn profiling off"""
+    global _active
+    if _active is not None and _active.calls:
+        _active.dump()
+    _active = None
+
+
+def checkpoint() -> None:
+    """Snapshot allocations at a memory peak inside a sampled call; free when not profiling"""
+    if _active is not None and _active.current is not None:
+        _active.checkpoint()
+
+
+def profiled(label: str, always: bool = False):
+    """
+    Profile sampled calls of the decorated function under label; always=True
+    profiles every call (for once-per-run phases like discovery)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            # Nested profiled calls run inside the outer sample
+            if profiler is None or profiler.current is not None or not profiler.sampled(label, always):
+                return func(*args, **kwargs)
+            profiler.enter(label)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.exit()
+        return wrapper
+    return decorator
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def build_report(profile_dir: Path, top: Optional[int] = None) -> str:
+    """Merge every process's results in profile_dir into one text report"""
+    import pstats
+    profile_dir = Path(profile_dir)
+    top = top or config.PROFILE_TOP
+    prof_files = sorted(profile_dir.glob("process-*.prof"))
+    alloc_files = sorted(profile_dir.glob("process-*.alloc.json"))
+    if not prof_files:
+        return f"No profile data in {profile_dir}"
+
+    calls: Dict[str, int] = {}
+    samples: Dict[str, int] = {}
+    peaks: Dict[str, list] = {}
+    rss_peaks: Dict[str, list] = {}
+    allocations: Dict[str, Dict[str, list]] = {}
+    for path in alloc_files:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for label, count in data['calls'].items():
+            calls[label] = calls.get(label, 0) + count
+        for label, count in data['samples'].items():
+            samples[label] = samples.get(label, 0) + count
+        for label, values in data['peaks'].items():
+            peaks.setdefault(label, []).extend(values)
+        for label, values in data.get('rss_peaks', {}).items():
+            rss_peaks.setdefault(label, []).extend(values)
+        for label, sites in data['allocations'].items():
+            merged = allocations.setdefault(label, {})
+            for site, (size, count) in sites.items():
+                entry = merged.setdefault(site, [0, 0])
+                entry[0] += size
+                entry[1] += count
+
+    out = io.StringIO()
+    out.write("=" * 78 + "\n")
+    out.write(f"PROFILE REPORT ({len(prof_files)} processes, {time.strftime('%Y-%m-%d %H:%M:%S')})\n")
+    out.write("=" * 78 + "\n")
+    for label in sorted(calls):
+        out.write(f"{label}: {samples.get(label, 0)} of {calls[label]} calls sampled\n")
+        label_rss = rss_peaks.get(label, [])
+        if label_rss:
+            out.write(f"    peak RSS growth per call (all memory, incl. Pillow pixel buffers): "
+                      f"max {format_size(max(label_rss))}, mean {format_size(sum(label_rss) / len(label_rss))}\n")
+        label_peaks = peaks.get(label, [])
+        if label_peaks:
+            out.write(f"    peak tracemalloc memory per call (Python and NumPy only): "
+                      f"max {format_size(max(label_peaks))}, mean {format_size(sum(label_peaks) / len(label_peaks))}\n")
+
+    stats = pstats.Stats(*[str(path) for path in prof_files], stream=out)
+    stats.strip_dirs()
+    out.write("\n" + "-" * 78 + "\nTop functions by cumulative time\n" + "-" * 78 + "\n")
+    stats.sort_stats('cumulative').print_stats(top)
+    out.write("-" * 78 + "\nTop functions by own time\n" + "-" * 78 + "\n")
+    stats.sort_stats('tottime').print_stats(top)
+
+    for label in sorted(allocations):
+        # Per sampled call, so numbers are comparable across sample rates
+        count = max(samples.get(label, 1), 1)
+        out.write("-" * 78 + f"\nTop Python/NumPy allocation sites in {label} (tracemalloc, average per "
+                  f"sampled call; Pillow pixel buffers are not traced)\n" + "-" * 78 + "\n")
+        ranked = sorted(allocations[label].items(), key=lambda item: -item[1][0])[:top]
+        for site, (size, blocks) in ranked:
+            out.write(f"{format_size(size / count):>12} {blocks / count:>10.0f} blocks  {site}\n")
+
+    return out.getvalue()
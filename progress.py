@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Run progress tracking
+Counts finished images against the total from discovery and reports throughput and
+ETA as periodic log lines, a terminal progress bar, a JSON status file and an
+optional local HTTP endpoint (JSON and Prometheus text format).
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Seconds as H:MM:SS, or '--:--' when unknown"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressTracker:
+    """
+    Progress counters for one run. Only the parent process updates them (from
+    record_result), so worker processes never share counters; a lock keeps
+    snapshots consistent for the HTTP endpoint thread.
+    """
+
+    def __init__(self, settings: Optional[config.Settings] = None):
+        self.settings = settings or config.Settings()
+        self.lock = threading.Lock()
+        self.reporters: List = []
+        self.server = None
+        self.reset(None)
+
+    def reset(self, total: Optional[int]) -> None:
+        """Zero the counters for a run of total images (None when unknown)"""
+        self.total = total
+        self.processed = 0
+        self.errors = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.started = time.monotonic()
+        self.started_at = time.time()
+        self.last_completed_at = None
+        self.state = 'idle'
+
+    def start(self, total: Optional[int]) -> None:
+        """Begin a run and start the configured reporters"""
+        with self.lock:
+            self.reset(total)
+            self.state = 'running'
+
+        settings = self.settings
+        show_bar = settings.progress_bar
+        if show_bar is None:
+            show_bar = sys.stderr.isatty()
+        self.reporters = [LogReporter(settings.log_progress_interval)]
+        if show_bar:
+            self.reporters.append(TerminalBar())
+        if settings.progress_status_file:
+            self.reporters.append(StatusFile(settings.progress_status_file,
+                                             settings.progress_status_interval))
+        if settings.progress_port is not None and self.server is None:
+            self.server = StatusServer(self, settings.progress_host, settings.progress_port)
+
+    def update(self, ok: bool, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        """Count one finished image"""
+        with self.lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.errors += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.last_completed_at = time.time()
+        self.tick()
+
+    def skip(self, count: int) -> None:
+        """Count images that will not be processed in this run"""
+        with self.lock:
+            self.skipped += count
+        self.tick()
+
+    def tick(self, final: bool = False) -> None:
+        """Let each reporter report if its interval has passed"""
+        if not self.reporters:
+            return
+        now = time.monotonic()
+        due = [reporter for reporter in self.reporters if final or reporter.due(now)]
+        if due:
+            snapshot = self.snapshot()
+            for reporter in due:
+                reporter.report(snapshot, final)
+
+    def finish(self) -> None:
+        """Mark the run as finished and write the final report everywhere"""
+        with self.lock:
+            if self.state != 'running':
+                return
+            self.state = 'finished'
+        self.tick(final=True)
+        self.reporters = []
+
+    def close(self) -> None:
+        """Stop the HTTP endpoint"""
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+    def snapshot(self) -> Dict:
+        """Consistent copy of the counters with derived rates and ETA"""
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            done = self.processed + self.errors
+            rate = done / elapsed
+            remaining = None
+            if self.total is not None:
+                remaining = max(self.total - done - self.skipped, 0)
+            eta = None
+            if remaining is not None and rate > 0:
+                eta = remaining / rate
+            return {
+                'state': self.state,
+                'total': self.total,
+                'done': done,
+                'processed': self.processed,
+                'errors': self.errors,
+                'skipped': self.skipped,
+                'remaining': remaining,
+                'percent': round(100.0 * done / self.total, 1) if self.total else None,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'elapsed_seconds': round(elapsed, 1),
+                'images_per_second': round(rate, 2),
+                'mb_per_second': round(self.bytes_in / elapsed / 1e6, 2),
+                'eta_seconds': round(eta, 1) if eta is not None else None,
+                'started_at': round(self.started_at, 3),
+                'last_completed_at': round(self.last_completed_at, 3) if self.last_completed_at else None,
+                'updated_at': round(time.time(), 3),
+                'pid': os.getpid()
+            }
+
+
+class IntervalReporter:
+    """Base for reporters that report at most once per interval"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_report = time.monotonic()
+
+    def due(self, now: float) -> bool:
+        if not self.interval or now - self.last_report < self.interval:
+            return False
+        self.last_report = now
+        return True
+
+
+class LogReporter(IntervalReporter):
+    """Aggregate progress lines in the log instead of one line per image"""
+
+    def report(self, snapshot: Dict, final: bool) -> None:
+        total = f"/{snapshot['total']}" if snapshot['total'] is not None else ""
+        logger.info("Progress: %d%s images (%d errors), %.1f images/s, %.1f MB/s, ETA %s",
+                    snapshot['done'], total, snapshot['errors'], snapshot['images_per_second'],
+                    snapshot['mb_per_second'], format_duration(snapshot['eta_seconds']),
+                    extra={'event': 'progress', 'done': snapshot['done'], 'total': snapshot['total'],
+                           'errors': snapshot['errors'], 'elapsed': snapshot['elapsed_seconds']})
+
+
+class TerminalBar(IntervalReporter):
+    """Single-line progress bar redrawn in place on stderr"""
+
+    WIDTH = 30
+
+    def __init__(self, interval: float = 0.2, stream=None):
+        super().__init__(interval)
+        self.stream = stream or sys.stderr
+
+    def report(self, snapshot: Dict, final: bool) -> None:
+        if snapshot['total']:
+            filled = int(self.WIDTH * min(snapshot['done'] / snapshot['total'], 1.0))
+            head = (f"[{'#' * filled}{'.' * (self.WIDTH - filled)}] {snapshot['percent']:5.1f}% "
+                    f"{snapshot['done']}/{snapshot['total']}")
+        else:
+            head = f"{snapshot['done']} images"
+        line = (f"{head} | {snapshot['images_per_second']:.1f} img/s | "
+                f"{snapshot['mb_per_second']:.1f} MB/s | ETA {format_duration(snapshot['eta_seconds'])}")
+        if snapshot['errors']:
+            line += f" | {snapshot['errors']} errors"
+        self.stream.write(f"\r\033[K{line}" + ("\n" if final else ""))
+        self.stream.flush()
+
+
+class StatusFile(IntervalReporter):
+    """JSON status file, replaced atomically so readers never see a partial write"""
+
+    def __init__(self, path, interval: float):
+        super().__init__(interval)
+        self.path = Path(path)
+        # Write right away so monitoring sees the run before the first interval passes
+        self.last_report = 0.0
+
+    def report(self, snapshot: Dict, final: bool) -> None:
+        temp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not write status file %s: %s", self.path, e)
+
+
+def prometheus_text(snapshot: Dict) -> str:
+    """Counters in the Prometheus text exposition format"""
+    metrics = [
+        ('image_processing_running', 'gauge', 'Whether a run is in progress',
+         1 if snapshot['state'] == 'running' else 0),
+        ('image_processing_images_total', 'gauge', 'Images discovered for this run', snapshot['total']),
+        ('image_processing_processed_total', 'counter', 'Images processed successfully', snapshot['processed']),
+        ('image_processing_errors_total', 'counter', 'Images that failed', snapshot['errors']),
+        ('image_processing_skipped_total', 'counter', 'Images skipped', snapshot['skipped']),
+        ('image_processing_input_bytes_total', 'counter', 'Bytes read from source images', snapshot['bytes_in']),
+        ('image_processing_output_bytes_total', 'counter', 'Bytes written', snapshot['bytes_out']),
+        ('image_processing_images_per_second', 'gauge', 'Average images per second', snapshot['images_per_second']),
+        ('image_processing_eta_seconds', 'gauge', 'Estimated seconds until the run finishes',
+         snapshot['eta_seconds']),
+        ('image_processing_last_completed_timestamp_seconds', 'gauge',
+         'Unix time the last image finished', snapshot['last_completed_at']),
+    ]
+    lines = []
+    for name, kind, help_text, value in metrics:
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class StatusServer:
+    """Local HTTP endpoint: /status (JSON) and /metrics (Prometheus text)"""
+
+    def __init__(self, tracker: ProgressTracker, host: str, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                snapshot = tracker.snapshot()
+                if self.path.rstrip('/') in ('', '/status'):
+                    body, content_type = json.dumps(snapshot).encode(), 'application/json'
+                elif self.path == '/metrics':
+                    body, content_type = prometheus_text(snapshot).encode(), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Status request: " + format, *args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='status-server', daemon=True)
+        self.thread.start()
+        logger.info("Progress endpoint: http://%s:%d/status and /metrics", host, self.httpd.server_port)
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
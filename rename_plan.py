@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Planned bulk moves for folder restructuring
+Computes the complete move plan up front, checks it for collisions, executes it in
+batches and keeps a journal so the whole reorganization can be undone
+"""
+
+import os
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional
+import config
+
+
+class PrefixIndex:
+    """Longest-prefix lookup of filename prefixes, independent of mapping order"""
+
+    def __init__(self, mapping: Dict[str, str]):
+        self.mapping = mapping
+        # Only lengths that some prefix actually has need to be checked
+        self.lengths = sorted({len(prefix) for prefix in mapping}, reverse=True)
+
+    def match(self, name: str) -> Optional[str]:
+        """Value for the longest prefix of name, or None if no prefix matches"""
+        for length in self.lengths:
+            value = self.mapping.get(name[:length])
+            if value is not None:
+                return value
+        return None
+
+
+class RenamePlan:
+    def __init__(self):
+        self.moves: List[Tuple[Path, Path]] = []
+        self.unknown: List[Path] = []
+        self.collisions: List[Tuple[Path, Path]] = []
+        self.cleanup_dirs: List[Path] = []
+
+    def add(self, source: Path, dest: Path) -> None:
+        """Add a planned move; moves onto the same path are ignored"""
+        if source != dest:
+            self.moves.append((source, dest))
+
+    def add_unknown(self, source: Path) -> None:
+        """Record a file the planner could not place"""
+        self.unknown.append(source)
+
+    def check_collisions(self) -> None:
+        """Move colliding entries out of the plan: duplicate targets or targets that already exist"""
+        seen = set()
+        safe_moves = []
+
+        for source, dest in self.moves:
+            # os.rename silently replaces existing files, so any existing target is a collision
+            if dest in seen or dest.exists():
+                self.collisions.append((source, dest))
+                continue
+            seen.add(dest)
+            safe_moves.append((source, dest))
+
+        self.moves = safe_moves
+
+    def print_summary(self) -> None:
+        """Print a per-folder summary of the plan instead of one line per file"""
+        by_target: Dict[Path, int] = {}
+        for _, dest in self.moves:
+            by_target[dest.parent] = by_target.get(dest.parent, 0) + 1
+
+        print(f"Planned moves: {len(self.moves)}")
+        for folder, count in sorted(by_target.items()):
+            print(f"  -> {folder}: {count} files")
+
+        if self.unknown:
+            print(f"Unknown prefix (left in place): {len(self.unknown)}")
+            for source in self.unknown[:10]:
+                print(f"  ? {source.name}")
+            if len(self.unknown) > 10:
+                print(f"  ... and {len(self.unknown) - 10} more")
+
+        if self.collisions:
+            print(f"Collisions (left in place): {len(self.collisions)}")
+            for source, dest in self.collisions[:10]:
+                print(f"  ! {source.name} -> {dest}")
+            if len(self.collisions) > 10:
+                print(f"  ... and {len(self.collisions) - 10} more")
+
+    def execute(self, journal_path: Path, batch_size: int = config.RENAME_BATCH_SIZE,
+                copy_workers: int = config.RENAME_COPY_WORKERS) -> int:
+        """
+        Execute the plan. Each batch is written to the journal before it runs, then
+        same-filesystem moves use os.rename and cross-filesystem moves are copied in
+        parallel. Returns the number of files moved.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Create every target folder once, not once per file
+        folder_devices = {}
+        for folder in sorted({dest.parent for _, dest in self.moves}):
+            folder.mkdir(parents=True, exist_ok=True)
+            folder_devices[folder] = folder.stat().st_dev
+
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        moved = 0
+
+        with open(journal_path, 'a', encoding='utf-8') as journal, \
+                ThreadPoolExecutor(max_workers=copy_workers) as executor:
+            for start in range(0, len(self.moves), batch_size):
+                batch = self.moves[start:start + batch_size]
+
+                # Write-ahead: the journal always covers every move that may have happened
+                for source, dest in batch:
+                    journal.write(json.dumps({'source': str(source), 'dest': str(dest)}) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+                cross_device = []
+                for source, dest in batch:
+                    if source.stat().st_dev == folder_devices[dest.parent]:
+                        os.rename(source, dest)
+                        moved += 1
+                    else:
+                        cross_device.append((source, dest))
+
+                for _ in executor.map(lambda move: shutil.move(str(move[0]), str(move[1])), cross_device):
+                    moved += 1
+
+        for folder in self.cleanup_dirs:
+            try:
+                folder.rmdir()
+                print(f"Removed empty folder: {folder}")
+            except OSError:
+                print(f"Could not remove folder (not empty): {folder}")
+
+        return moved
+
+
+def default_journal_path() -> Path:
+    """Timestamped journal file for a new run"""
+    return Path(config.RENAME_JOURNAL_DIR) / f"rename_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+
+
+def undo_journal(journal_path: Path) -> int:
+    """Reverse every completed move recorded in a journal, newest first; returns the number undone"""
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    undone = 0
+    for entry in reversed(entries):
+        source, dest = Path(entry['source']), Path(entry['dest'])
+        # Entries journaled ahead of a crash may never have been moved
+        if not dest.exists() or source.exists():
+            continue
+        source.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(dest), str(source))
+        undone += 1
+
+    return undone
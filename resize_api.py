@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Library API for using the image resizer from other Python code
+Importing this module is cheap: Pillow and the processor are only loaded on first use,
+and no logging handlers or log files are set up
+"""
+
+from typing import Iterable, Iterator, List, Optional
+import config
+
+# Processor built from the default settings, shared by calls that pass no settings
+_default_processor = None
+
+
+def get_processor(settings: Optional[config.Settings] = None):
+    """Return an ImageProcessor for the given settings, reusing the default one when possible"""
+    global _default_processor
+    from image_processor import ImageProcessor
+
+    if settings is not None:
+        return ImageProcessor(settings)
+
+    if _default_processor is None:
+        _default_processor = ImageProcessor()
+    return _default_processor
+
+
+def process_bytes(data: bytes, settings: Optional[config.Settings] = None) -> bytes:
+    """Resize and re-encode one image held in memory; raises on unreadable input"""
+    return get_processor(settings).process_bytes(data)
+
+
+def process_stream(source, output=None, settings: Optional[config.Settings] = None) -> Optional[memoryview]:
+    """
+    Resize and re-encode an image from bytes, a buffer or a readable file object.
+    Writes to output when given, otherwise returns a memoryview of the encoded image.
+    """
+    return get_processor(settings).process_stream(source, output)
+
+
+def process_batch(sources: Iterable, settings: Optional[config.Settings] = None,
+                  workers: int = 1) -> List[memoryview]:
+    """Process a batch of in-memory images, optionally on several threads"""
+    return get_processor(settings).process_stream_batch(sources, workers)
+
+
+def process_many(items: Iterable[bytes], settings: Optional[config.Settings] = None) -> Iterator[bytes]:
+    """Resize and re-encode several in-memory images, sharing one processor between them"""
+    processor = get_processor(settings)
+    for data in items:
+        yield processor.process_bytes(data)
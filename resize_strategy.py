@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Resize strategy selection
+Skips resampling when nothing changes, lets JPEG decode at reduced scale, reduces
+large downscales by integer factors first and applies a configurable final filter
+"""
+
+from typing import Optional, Tuple
+from PIL import Image
+import config
+
+FILTERS = {
+    'nearest': Image.Resampling.NEAREST,
+    'box': Image.Resampling.BOX,
+    'bilinear': Image.Resampling.BILINEAR,
+    'hamming': Image.Resampling.HAMMING,
+    'bicubic': Image.Resampling.BICUBIC,
+    'lanczos': Image.Resampling.LANCZOS
+}
+
+
+def get_filter(name: str) -> Image.Resampling:
+    """Resampling filter for a configured name"""
+    try:
+        return FILTERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown resize filter '{name}', expected one of: {', '.join(FILTERS)}")
+
+
+class ResizeStrategy:
+    def __init__(self, filter_name: str = 'lanczos', reducing_gap: Optional[float] = None,
+                 jpeg_draft: bool = False):
+        self.filter_name = filter_name
+        self.resample = get_filter(filter_name)
+        self.reducing_gap = reducing_gap
+        self.jpeg_draft = jpeg_draft
+
+    @classmethod
+    def for_category(cls, settings: config.Settings, category: Optional[str]) -> 'ResizeStrategy':
+        """Strategy for an image category, falling back to the global settings"""
+        filter_name = settings.resize_filter_by_category.get(category, settings.resize_filter)
+        return cls(filter_name, settings.resize_reducing_gap, settings.resize_jpeg_draft)
+
+    def prepare(self, img: Image.Image, box: Tuple[int, int]) -> None:
+        """
+        Before decoding, let JPEG images decode at a reduced DCT scale that still
+        leaves at least reducing_gap times the target box
+        """
+        if not self.jpeg_draft or img.format != 'JPEG':
+            return
+        gap = self.reducing_gap or 1.0
+        img.draft('RGB', (int(box[0] * gap), int(box[1] * gap)))
+
+    def resize(self, img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+        """Resize to size, or return the image untouched if it already has that size"""
+        if img.size == tuple(size):
+            return img
+        # With reducing_gap, Pillow first shrinks by an integer factor with a cheap box
+        # reduction and only runs the final filter over the remaining, smaller image
+        return img.resize(size, self.resample, reducing_gap=self.reducing_gap)
+
+    def __repr__(self) -> str:
+        return (f"ResizeStrategy({self.filter_name}, reducing_gap={self.reducing_gap}, "
+                f"jpeg_draft={self.jpeg_draft})")
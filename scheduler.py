@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Job scheduling for batch runs
+Orders work by category priority, recent changes and estimated cost
+"""
+
+import time
+from pathlib import Path
+from typing import List, Tuple, Optional
+import config
+
+
+class JobScheduler:
+    def __init__(self, source_dir: Path, settings: Optional[config.Settings] = None):
+        settings = settings or config.Settings()
+        self.source_dir = source_dir
+        self.category_priority = settings.category_priority
+        self.default_priority = settings.default_priority
+        self.recent_seconds = settings.schedule_recent_hours * 3600
+        self.cost_mode = settings.schedule_cost
+
+    def get_category(self, source_path: Path) -> str:
+        """Top-level folder of an image, i.e. its product category"""
+        try:
+            return source_path.relative_to(self.source_dir).parts[0]
+        except (ValueError, IndexError):
+            return source_path.parent.name
+
+    def get_priority(self, source_path: Path) -> int:
+        """Configured priority for the image's category (higher runs first)"""
+        return self.category_priority.get(self.get_category(source_path), self.default_priority)
+
+    def estimate_cost(self, source_path: Path, file_size: int) -> int:
+        """Estimate processing cost from the pixel count in the header, or the file size"""
+        if self.cost_mode == "pixels":
+            from PIL import Image
+            try:
+                # Only the header is read here; pixel data is decoded lazily
+                with Image.open(source_path) as img:
+                    return img.size[0] * img.size[1]
+            except Exception:
+                pass
+        return file_size
+
+    def sort_key(self, source_path: Path, now: float) -> Tuple[int, int, int]:
+        """Sort key: priority, then recently changed, then largest first"""
+        try:
+            stat = source_path.stat()
+            file_size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            file_size, mtime = 0, 0.0
+
+        recent = 1 if now - mtime <= self.recent_seconds else 0
+        cost = self.estimate_cost(source_path, file_size)
+        return (-self.get_priority(source_path), -recent, -cost)
+
+    def order(self, jobs: List[Tuple[Path, Path]]) -> List[Tuple[Path, Path]]:
+        """Return jobs in scheduled order; ties keep discovery order"""
+        now = time.time()
+        keys = {source: self.sort_key(source, now) for source, _ in jobs}
+        return sorted(jobs, key=lambda job: keys[job[0]])
+
+
+class Deadline:
+    """Time budget for a run; work stops being started once it expires"""
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    def reached(self) -> bool:
+        """Check whether the time budget is used up"""
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget, or None when unlimited"""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
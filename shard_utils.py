@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Sharding utilities for distributing batch runs across several machines
+Provides deterministic path sharding, run manifests and a SQLite work queue
+"""
+
+import os
+import json
+import socket
+import sqlite3
+import hashlib
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Iterable
+import config
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a shard specification like '2/8' into (index, count)"""
+    try:
+        index_text, count_text = value.split("/", 1)
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected INDEX/COUNT (e.g. 0/4)")
+
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}', index must be in 0..{max(count - 1, 0)}")
+
+    return index, count
+
+
+def shard_for_key(key: str, count: int) -> int:
+    """Map a relative source path to a shard number, stable across hosts"""
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def default_worker_id() -> str:
+    """Identify this node in manifests and queue claims"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RunManifest:
+    """Record of every item a node processed, plus an aggregate run report"""
+
+    def __init__(self, shard: Optional[Tuple[int, int]] = None, worker: Optional[str] = None):
+        self.shard = shard
+        self.worker = worker or default_worker_id()
+        self.started = time.time()
+        self.items: List[Dict] = []
+
+    def record(self, source_key: str, dest_key: str, ok: bool, seconds: float,
+               bytes_in: int = 0, bytes_out: int = 0, quarantine_reason: Optional[str] = None) -> None:
+        """Add one processed item to the manifest"""
+        item = {
+            'source': source_key,
+            'dest': dest_key,
+            'status': 'ok' if ok else 'error',
+            'seconds': round(seconds, 4),
+            'bytes_in': bytes_in,
+            'bytes_out': bytes_out,
+            'worker': self.worker
+        }
+        if quarantine_reason:
+            item['status'] = 'quarantined'
+            item['reason'] = quarantine_reason
+        self.items.append(item)
+
+    def report(self) -> Dict:
+        """Summarize the recorded items"""
+        return summarize_items(self.items, time.time() - self.started)
+
+    def to_dict(self) -> Dict:
+        """Serializable form of the manifest"""
+        return {
+            'shards': [f"{self.shard[0]}/{self.shard[1]}"] if self.shard else [],
+            'workers': [self.worker],
+            'started': self.started,
+            'finished': time.time(),
+            'report': self.report(),
+            'items': self.items
+        }
+
+    def write(self, path: Path) -> None:
+        """Write the manifest as JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def summarize_items(items: Iterable[Dict], elapsed: float) -> Dict:
+    """Aggregate counters for a list of manifest items"""
+    report = {'processed': 0, 'errors': 0, 'bytes_in': 0, 'bytes_out': 0,
+              'cpu_seconds': 0.0, 'elapsed_seconds': round(elapsed, 2), 'quarantined': []}
+    for item in items:
+        if item['status'] == 'ok':
+            report['processed'] += 1
+        else:
+            # Quarantined items are errors too, and are also listed with their reason
+            report['errors'] += 1
+            if item['status'] == 'quarantined':
+                report['quarantined'].append({'source': item['source'], 'reason': item.get('reason')})
+        report['bytes_in'] += item.get('bytes_in', 0)
+        report['bytes_out'] += item.get('bytes_out', 0)
+        report['cpu_seconds'] += item.get('seconds', 0.0)
+    report['cpu_seconds'] = round(report['cpu_seconds'], 2)
+    return report
+
+
+def merge_manifests(paths: List[Path]) -> Dict:
+    """Combine per-shard manifests into a single manifest and run report"""
+    merged_items: Dict[str, Dict] = {}
+    shards, workers = set(), set()
+    duplicates = []
+    started, finished = None, None
+
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        shards.update(manifest.get('shards', []))
+        workers.update(manifest.get('workers', []))
+        started = manifest['started'] if started is None else min(started, manifest['started'])
+        finished = manifest['finished'] if finished is None else max(finished, manifest['finished'])
+
+        for item in manifest.get('items', []):
+            previous = merged_items.get(item['source'])
+            if previous is not None:
+                duplicates.append(item['source'])
+                # A successful attempt beats a failed one from another node
+                if previous['status'] == 'ok' and item['status'] != 'ok':
+                    continue
+            merged_items[item['source']] = item
+
+    items = sorted(merged_items.values(), key=lambda item: item['source'])
+    elapsed = (finished - started) if started is not None else 0.0
+    report = summarize_items(items, elapsed)
+    report['duplicates'] = len(duplicates)
+
+    # Flag shards that never reported when all manifests agree on the count
+    counts = {int(shard.split("/")[1]) for shard in shards}
+    if len(counts) == 1:
+        count = counts.pop()
+        present = {int(shard.split("/")[0]) for shard in shards}
+        report['missing_shards'] = [f"{i}/{count}" for i in range(count) if i not in present]
+
+    return {
+        'shards': sorted(shards),
+        'workers': sorted(workers),
+        'started': started,
+        'finished': finished,
+        'report': report,
+        'items': items
+    }
+
+
+class WorkQueue:
+    """SQLite-backed job queue shared by all nodes for dynamic work-stealing"""
+
+    def __init__(self, db_path: Path, lease_seconds: Optional[int] = None):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds if lease_seconds is not None else config.QUEUE_LEASE_SECONDS
+        self.conn = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " source TEXT PRIMARY KEY,"
+            " dest TEXT NOT NULL,"
+            " shard INTEGER NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " worker TEXT,"
+            " claimed_at REAL,"
+            " finished_at REAL)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]
+        if 'priority' not in columns:
+            # Queue files created before jobs carried their scheduled position
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        # Claims are single indexed LIMIT 1 lookups: pending jobs in scheduled order
+        # (within a shard, or across all shards), and expired leases by claim time
+        for old_index in ("jobs_status", "jobs_pending"):
+            self.conn.execute(f"DROP INDEX IF EXISTS {old_index}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_shard_order ON jobs (status, shard, priority, source)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_order ON jobs (status, priority, source)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (status, claimed_at)")
+
+    def populate(self, jobs: List[Tuple[str, str]], shard_count: int) -> int:
+        """
+        Add (source, dest) keys to the queue in scheduled order; claims follow that
+        order. Already-known sources are kept as-is.
+        """
+        rows = [(source, dest, shard_for_key(source, shard_count), position)
+                for position, (source, dest) in enumerate(jobs)]
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (source, dest, shard, priority) VALUES (?, ?, ?, ?)", rows
+            )
+            added = self.conn.total_changes - before
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, worker: str, preferred_shard: Optional[int] = None) -> Optional[Tuple[str, str]]:
+        """Claim the next job, preferring this node's own shard before stealing others"""
+        now = time.time()
+        expired = now - self.lease_seconds
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = None
+            if preferred_shard is not None:
+                row = self.conn.execute(
+                    "SELECT source, dest FROM jobs WHERE status = 'pending' AND shard = ?"
+                    " ORDER BY priority, source LIMIT 1", (preferred_shard,)
+                ).fetchone() or self.conn.execute(
+                    "SELECT source, dest FROM jobs WHERE status = 'claimed' AND claimed_at < ?"
+                    " AND shard = ? LIMIT 1", (expired, preferred_shard)
+                ).fetchone()
+            if row is None:
+                row = self.conn.execute(
+                    "SELECT source, dest FROM jobs WHERE status = 'pending'"
+                    " ORDER BY priority, source LIMIT 1"
+                ).fetchone() or self.conn.execute(
+                    "SELECT source, dest FROM jobs WHERE status = 'claimed' AND claimed_at < ? LIMIT 1",
+                    (expired,)
+                ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'claimed', worker = ?, claimed_at = ? WHERE source = ?",
+                    (worker, now, row[0])
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def complete(self, source: str, ok: bool) -> None:
+        """Mark a claimed job as done or failed"""
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE source = ?",
+            ('done' if ok else 'failed', time.time(), source)
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each state"""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self) -> None:
+        self.conn.close()
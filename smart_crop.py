@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Smart cropping to a fixed aspect ratio
+Chooses the crop window from a gradient-energy saliency map computed on a small
+downscaled proxy, so the full-size image is only cropped once before resizing
+"""
+
+from typing import Optional, Tuple
+import config
+
+
+def parse_aspect(value: Optional[str]) -> Optional[float]:
+    """Parse an aspect ratio like '4:3' or '1.5' into width / height"""
+    if not value:
+        return None
+    try:
+        if ":" in value:
+            width, height = value.split(":", 1)
+            aspect = float(width) / float(height)
+        else:
+            aspect = float(value)
+    except (ValueError, ZeroDivisionError):
+        raise ValueError(f"Invalid aspect ratio '{value}', expected e.g. 4:3 or 1:1")
+
+    if aspect <= 0:
+        raise ValueError(f"Invalid aspect ratio '{value}', must be positive")
+    return aspect
+
+
+def crop_window_size(width: int, height: int, aspect: float) -> Tuple[int, int]:
+    """Largest window of the given aspect ratio that fits in width x height"""
+    if width / height > aspect:
+        return max(1, round(height * aspect)), height
+    return width, max(1, round(width / aspect))
+
+
+def aspect_output_size(width: int, height: int, max_width: int, max_height: int,
+                       aspect: float) -> Tuple[int, int]:
+    """
+    Output size of exactly the given aspect ratio (to the nearest pixel) that fits both
+    the cropped width x height and the max box; one side is derived from the ratio and
+    rounded, instead of both being scaled and truncated
+    """
+    limit_width, limit_height = min(width, max_width), min(height, max_height)
+    out_width = max(1, min(limit_width, round(limit_height * aspect)))
+    out_height = max(1, round(out_width / aspect))
+    if out_height > limit_height:
+        out_height = limit_height
+        out_width = max(1, round(out_height * aspect))
+    return out_width, out_height
+
+
+# Modes Image.reduce averages meaningfully; palette, bilevel and 16-bit modes are converted first
+REDUCIBLE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F'}
+
+
+def reducible(img):
+    """The image itself, or a grayscale (or 32-bit integer) version that Image.reduce supports"""
+    if img.mode in REDUCIBLE_MODES:
+        return img
+    if img.mode.startswith('I;16'):
+        return img.convert('I')
+    try:
+        return img.convert('L')
+    except ValueError:
+        # Modes without a direct conversion (La, LAB) keep lightness in their first band
+        return img.getchannel(0)
+
+
+def saliency_map(img, proxy_size: int):
+    """Gradient-energy map of a small grayscale proxy of the image"""
+    import numpy as np
+
+    img = reducible(img)
+    # Box reduction by an integer factor is much cheaper than a filtered resize
+    factor = max(1, min(img.size) // proxy_size)
+    proxy = img.reduce(factor) if factor > 1 else img
+    if proxy.mode in ('I', 'F'):
+        # Wide-range images are scaled to 0-255 so the centre bias weighs the same
+        gray = np.asarray(proxy, dtype=np.float32)
+        span = float(gray.max() - gray.min())
+        gray = (gray - gray.min()) * (255.0 / span) if span else np.zeros_like(gray)
+    else:
+        gray = np.asarray(proxy.convert('L'), dtype=np.float32)
+
+    energy = np.zeros_like(gray)
+    energy[:, 1:] += np.abs(np.diff(gray, axis=1))
+    energy[1:, :] += np.abs(np.diff(gray, axis=0))
+    return energy
+
+
+def best_offset(profile, window: int, center_bias: float) -> int:
+    """Start of the window along a 1D energy profile with the highest total energy"""
+    import numpy as np
+
+    positions = len(profile) - window + 1
+    if positions <= 1:
+        return 0
+
+    cumulative = np.concatenate(([0.0], np.cumsum(profile, dtype=np.float64)))
+    sums = cumulative[window:] - cumulative[:positions]
+
+    # A mild centre bias keeps flat images centred instead of snapping to an edge
+    distance = np.abs(np.arange(positions) - (positions - 1) / 2) / ((positions - 1) / 2)
+    sums = sums + center_bias * max(sums.max(), 1.0) * (1.0 - distance)
+    return int(np.argmax(sums))
+
+
+def find_crop_box(img, aspect: float, proxy_size: Optional[int] = None,
+                  center_bias: Optional[float] = None) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Crop box (left, top, right, bottom) for the most salient window, or None if no crop is needed.
+    proxy_size and center_bias default to the module configuration.
+    """
+    proxy_size = config.CROP_PROXY_SIZE if proxy_size is None else proxy_size
+    center_bias = config.CROP_CENTER_BIAS if center_bias is None else center_bias
+    width, height = img.size
+    crop_width, crop_height = crop_window_size(width, height, aspect)
+    if (crop_width, crop_height) == (width, height):
+        return None
+
+    energy = saliency_map(img, proxy_size)
+
+    # Only one axis is cropped, so a 1D sliding window over the energy profile is enough
+    if crop_width < width:
+        scale = width / energy.shape[1]
+        window = max(1, min(energy.shape[1], round(crop_width / scale)))
+        left = min(round(best_offset(energy.sum(axis=0), window, center_bias) * scale), width - crop_width)
+        return left, 0, left + crop_width, crop_height
+
+    scale = height / energy.shape[0]
+    window = max(1, min(energy.shape[0], round(crop_height / scale)))
+    top = min(round(best_offset(energy.sum(axis=1), window, center_bias) * scale), height - crop_height)
+    return 0, top, crop_width, top + crop_height
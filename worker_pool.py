@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Isolated worker processes with per-job timeouts
+Each worker runs one job at a time over its own pipe. A job that runs past the
+timeout, or that kills its worker (segfault, out-of-memory), is reported and the
+worker is replaced; the other workers keep going.
+"""
+
+import time
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(conn, func: Callable, initializer: Optional[Callable], initargs: tuple,
+                 memory_limit_mb: Optional[int], finalizer: Optional[Callable] = None) -> None:
+    """Worker loop: run func on each received argument tuple until None arrives, then run finalizer"""
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        if args is None:
+            if finalizer is not None:
+                finalizer()
+            return
+        try:
+            conn.send(('ok', func(*args)))
+        except BaseException as e:
+            conn.send(('error', e if _picklable(e) else RuntimeError(repr(e))))
+
+
+def _picklable(value: Any) -> bool:
+    import pickle
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.key = None
+        self.started = 0.0
+
+
+class IsolatedWorkerPool:
+    """
+    Pool of worker processes running func(*args) one job per worker at a time.
+    Results come back from wait() as (key, status, value) with status 'ok'
+    (value is the return value), 'error' (the exception), 'timeout' or 'crash'
+    (the worker's exit code).
+    """
+
+    def __init__(self, func: Callable, workers: int, timeout: Optional[float] = None,
+                 initializer: Optional[Callable] = None, initargs: tuple = (),
+                 memory_limit_mb: Optional[int] = None, finalizer: Optional[Callable] = None):
+        self.func = func
+        self.size = max(1, workers)
+        self.timeout = timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self.memory_limit_mb = memory_limit_mb
+        # Run in each worker when the pool is closed normally (not for killed workers)
+        self.finalizer = finalizer
+        self.context = multiprocessing.get_context()
+        self.workers: List[_Worker] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def spawn(self) -> _Worker:
+        """Start one worker process"""
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(child_conn, self.func, self.initializer, self.initargs, self.memory_limit_mb,
+                  self.finalizer),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        self.workers.append(worker)
+        return worker
+
+    def idle(self) -> int:
+        """Number of jobs that can be submitted without waiting"""
+        return self.size - self.busy()
+
+    def busy(self) -> int:
+        """Number of jobs in flight"""
+        return sum(1 for worker in self.workers if worker.key is not None)
+
+    def submit(self, key, args: tuple) -> None:
+        """Start a job on an idle worker; key identifies it in the results"""
+        worker = next((w for w in self.workers if w.key is None), None)
+        if worker is None:
+            if len(self.workers) >= self.size:
+                raise RuntimeError("No idle worker")
+            worker = self.spawn()
+        worker.conn.send(args)
+        worker.key = key
+        worker.started = time.monotonic()
+
+    def wait(self) -> List[Tuple[Any, str, Any]]:
+        """Block until at least one job finishes, fails or times out"""
+        results = []
+        while not results:
+            busy = [worker for worker in self.workers if worker.key is not None]
+            if not busy:
+                return results
+
+            wait_timeout = None
+            if self.timeout:
+                now = time.monotonic()
+                wait_timeout = max(0.0, min(w.started + self.timeout for w in busy) - now)
+
+            ready = set(wait([w.conn for w in busy] + [w.process.sentinel for w in busy], wait_timeout))
+            now = time.monotonic()
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        status, value = worker.conn.recv()
+                    except (EOFError, OSError):
+                        results.append(self.replace(worker, 'crash'))
+                        continue
+                    results.append((worker.key, status, value))
+                    worker.key = None
+                elif worker.process.sentinel in ready:
+                    results.append(self.replace(worker, 'crash'))
+                elif self.timeout and now - worker.started >= self.timeout:
+                    logger.warning("Job %s exceeded %.0fs, restarting its worker", worker.key, self.timeout)
+                    results.append(self.replace(worker, 'timeout'))
+        return results
+
+    def replace(self, worker: _Worker, status: str) -> Tuple[Any, str, Any]:
+        """Kill a hung or dead worker; a new one is started on the next submit"""
+        key = worker.key
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+        self.workers.remove(worker)
+        return key, status, worker.process.exitcode
+
+    def close(self) -> None:
+        """Stop all workers, killing any that are still busy"""
+        for worker in self.workers:
+            try:
+                if worker.key is None:
+                    worker.conn.send(None)
+                else:
+                    worker.process.kill()
+            except OSError:
+                worker.process.kill()
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        self.workers = []